@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+"""
+Latency of the all_tags filter vs. number of tags and corpus size,
+comparing the grouped semi-join against one EXISTS per tag.
+"""
+
+from benchmarks.common import get_bench_app, populate, clear, timeit
+
+from memedata.models import Text, Tag
+from memedata.resources.texts import TextsRes
+
+CORPUS_SIZES = [1000, 10000, 100000]
+N_TAGS = [1, 2, 4, 6]
+
+def legacy_all_tags(contents):
+    query = Text.query.order_by(Text.created_at.desc())
+    tags = Tag.query.filter(Tag.content.in_(contents)).all()
+    for t in tags:
+        query = query.filter(Text.tags.contains(t))
+    return query.limit(1000).all()
+
+def semi_join_all_tags(contents):
+    args = {'all_tags': contents, 'offset': 0, 'max_n_results': 1000}
+    return TextsRes.filter_texts(args)
+
+def main():
+    app = get_bench_app()
+    print('{:>8} {:>6} {:>12} {:>12}'.format(
+        'n_texts', 'n_tags', 'legacy (ms)', 'semi (ms)'))
+    with app.app_context():
+        for size in CORPUS_SIZES:
+            clear()
+            #few tags so that intersections are not empty
+            tags = populate(size, n_tags=8, max_n_tags_per_text=6)
+            for n in N_TAGS:
+                legacy = timeit(lambda: legacy_all_tags(tags[:n]))
+                semi = timeit(lambda: semi_join_all_tags(tags[:n]))
+                print('{:>8} {:>6} {:>12.2f} {:>12.2f}'.format(
+                    size, n, legacy, semi))
+
+if __name__ == '__main__':
+    main()
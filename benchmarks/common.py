@@ -0,0 +1,49 @@
+import random
+import time
+
+from memedata.app import get_app
+from memedata import config
+from memedata.database import db
+from memedata.models import Text, Tag, text_tag_association
+
+def get_bench_app():
+    app = get_app(config.get_app_test_config_class())
+    with app.app_context():
+        db.create_all()
+    return app
+
+def populate(n_texts, n_tags, max_n_tags_per_text=5, seed=0):
+    """
+    Fills database with random texts/tags. Must run within app context.
+    """
+    rng = random.Random(seed)
+    tag_contents = ['tag{}'.format(i) for i in range(n_tags)]
+    db.session.execute(Tag.__table__.insert(),
+        [{'content': c} for c in tag_contents])
+    db.session.execute(Text.__table__.insert(),
+        [{'content': 'text {}'.format(i)} for i in range(n_texts)])
+    rows = []
+    for text_id in range(1, n_texts + 1):
+        n = rng.randint(0, max_n_tags_per_text)
+        for tag_id in rng.sample(range(1, n_tags + 1), n):
+            rows.append({'text_id': text_id, 'tag_id': tag_id})
+    db.session.execute(text_tag_association.insert(), rows)
+    db.session.commit()
+    return tag_contents
+
+def clear():
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+def timeit(fn, n_runs=10):
+    """
+    Returns best wall time of n_runs calls to fn, in milliseconds.
+    """
+    best = None
+    for __ in range(n_runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return 1000*best
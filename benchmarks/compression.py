@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+"""
+Size and latency of a 1000-texts GET /texts page per content encoding,
+computed (cache miss) and served pre-compressed from cache (hit).
+"""
+
+from benchmarks.common import get_bench_app, populate, timeit
+
+from flask_jwt_extended import create_access_token
+
+from memedata import compression
+from memedata.extensions import texts_query_cache
+
+N_TEXTS = 10000
+N_TAGS = 100
+URL = '/texts?max_n_results=1000'
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        populate(N_TEXTS, n_tags=N_TAGS)
+        token = create_access_token('bench')
+    client = app.test_client()
+    auth = {'Authorization': 'Bearer {}'.format(token)}
+
+    def get(headers, clear):
+        if clear:
+            with app.app_context():
+                texts_query_cache.clear()
+        return client.get(URL, headers=headers)
+
+    encodings = ['identity', 'gzip'] + (['br'] if compression.brotli else [])
+    print('{:<9} {:>11} {:>10} {:>10}'.format(
+        'encoding', 'size (KiB)', 'miss (ms)', 'hit (ms)'))
+    for encoding in encodings:
+        headers = dict(auth, **{'Accept-Encoding': encoding})
+        size = len(get(headers, True).data)/1024
+        miss = timeit(lambda: get(headers, True), n_runs=10)
+        hit = timeit(lambda: get(headers, False), n_runs=50)
+        print('{:<9} {:>11.1f} {:>10.2f} {:>10.2f}'.format(
+            encoding, size, miss, hit))
+
+if __name__ == '__main__':
+    main()
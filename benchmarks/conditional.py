@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+"""
+Latency of polling GET /texts/<id> and GET /texts with and without
+validators (304 Not Modified vs. full 200 responses).
+"""
+
+from benchmarks.common import get_bench_app, populate, timeit
+
+from flask_jwt_extended import create_access_token
+
+N_TEXTS = 100000
+N_TAGS = 1000
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        populate(N_TEXTS, n_tags=N_TAGS)
+        token = create_access_token('bench')
+    client = app.test_client()
+    auth = {'Authorization': 'Bearer {}'.format(token)}
+
+    print('{:<32} {:>9} {:>9}'.format('url', '200 (ms)', '304 (ms)'))
+    for url in ['/texts/500', '/texts?max_n_results=100',
+            '/texts?max_n_results=1000']:
+        etag = client.get(url, headers=auth).headers['ETag']
+        full = timeit(lambda: client.get(url, headers=auth), n_runs=50)
+        headers = dict(auth, **{'If-None-Match': etag})
+        assert client.get(url, headers=headers).status_code == 304
+        cond = timeit(lambda: client.get(url, headers=headers), n_runs=50)
+        print('{:<32} {:>9.2f} {:>9.2f}'.format(url, full, cond))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+"""
+Latency of counting texts matching filters: paging through GET /texts vs.
+GET /texts/count uncached, cached and approximate (after a write).
+"""
+
+from benchmarks.common import get_bench_app, populate, timeit
+
+from flask_jwt_extended import create_access_token
+
+from memedata.extensions import text_counts_cache, texts_query_cache
+
+N_TEXTS = 100000
+N_TAGS = 1000
+QUERIES = [
+    'any_tags=tag1',
+    'all_tags=tag1,tag2',
+    'no_tags=tag1',
+    '',
+]
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        populate(N_TEXTS, n_tags=N_TAGS)
+        token = create_access_token('bench')
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+
+    def page_count(query):
+        n = 0
+        cursor = None
+        while True:
+            url = '/texts?max_n_results=1000&fields=text_id&' + query
+            if cursor is not None:
+                url += '&cursor=' + cursor
+            with app.app_context():
+                texts_query_cache.clear()
+            page = client.get(url, headers=headers).json
+            n += len(page['texts'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return n
+
+    def count(query, clear=False, approximate=False):
+        if clear:
+            with app.app_context():
+                text_counts_cache.clear()
+        url = '/texts/count?approximate={}&{}'.format(
+            'true' if approximate else 'false', query)
+        return client.get(url, headers=headers).json
+
+    print('{:<20} {:>11} {:>11} {:>11} {:>11}'.format(
+        'query', 'pages (ms)', 'miss (ms)', 'hit (ms)', 'approx (ms)'))
+    for query in QUERIES:
+        assert page_count(query) == count(query, clear=True)['n_texts']
+        pages = timeit(lambda: page_count(query), n_runs=3)
+        miss = timeit(lambda: count(query, clear=True), n_runs=10)
+        hit = timeit(lambda: count(query), n_runs=50)
+        #a write invalidates exact counts but not approximate ones
+        client.post('/texts', data={'content': 'new'}, headers=headers)
+        approx = timeit(lambda: count(query, approximate=True), n_runs=50)
+        print('{:<20} {:>11.2f} {:>11.2f} {:>11.2f} {:>11.2f}'.format(
+            query or '(all)', pages, miss, hit, approx))
+
+if __name__ == '__main__':
+    main()
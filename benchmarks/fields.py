@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+"""
+Latency of GET /texts pages with all fields vs. a projection without tags.
+"""
+
+from benchmarks.common import get_bench_app, populate, clear, timeit
+
+from flask_jwt_extended import create_access_token
+
+from memedata import config
+
+CORPUS_SIZE = 10000
+PAGE_SIZES = [100, 1000]
+FIELDS = [None, 'text_id,content', 'text_id,content,tags']
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        clear()
+        populate(CORPUS_SIZE, n_tags=64, max_n_tags_per_text=6)
+        token = create_access_token(identity=next(iter(config.superusers)))
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+
+    print('{:>6} {:>22} {:>10}'.format('n', 'fields', 'time (ms)'))
+    for n in PAGE_SIZES:
+        for fields in FIELDS:
+            query = {'max_n_results': n}
+            if fields is not None:
+                query['fields'] = fields
+            elapsed = timeit(lambda: client.get(
+                '/texts', query_string=query, headers=headers))
+            print('{:>6} {:>22} {:>10.2f}'.format(n, fields or 'all', elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+"""
+Latency of GET /texts/next internals with many consumers,
+for dense and sparse tag filters (a rare tag on the first and last texts),
+and size of the snapshots they walk (stored once per distinct snapshot).
+"""
+
+import random
+
+from benchmarks.common import get_bench_app, populate, clear, timeit
+
+from memedata.database import db
+from memedata.models import Rotation, Snapshot, Tag, text_tag_association
+from memedata.resources.texts import TextsNextRes
+
+CORPUS_SIZE = 100000
+N_CONSUMERS = 5000
+FILTERS = [
+    {},
+    {'any_tags': ['tag0']},
+    {'all_tags': ['tag0', 'tag1']},
+    {'any_tags': ['rare']},
+]
+
+def main():
+    app = get_bench_app()
+    rng = random.Random(0)
+    with app.app_context():
+        clear()
+        populate(CORPUS_SIZE, n_tags=16, max_n_tags_per_text=4)
+        db.session.execute(Tag.__table__.insert(),
+            {'tag_id': 17, 'content': 'rare'})
+        db.session.execute(text_tag_association.insert(),
+            [{'text_id': i, 'tag_id': 17} for i in (1, CORPUS_SIZE)])
+        db.session.commit()
+        print('{:>30} {:>10} {:>12} {:>14} {:>12}'.format(
+            'filters', 'n_rotations', 'n_snapshots', 'snapshots (kB)',
+            'next (ms)'))
+        for filters in FILTERS:
+            args = dict(filters, n=1, tz='UTC')
+            #warming up consumers
+            for i in range(N_CONSUMERS):
+                TextsNextRes.next_text_ids(dict(args, consumer=str(i)))
+            elapsed = timeit(lambda: TextsNextRes.next_text_ids(
+                dict(args, consumer=str(rng.randrange(N_CONSUMERS)))),
+                n_runs=200)
+            n_snapshots, size = db.session.query(db.func.count(),
+                db.func.sum(db.func.length(Snapshot.ids))).one()
+            print('{:>30} {:>10} {:>12} {:>14.0f} {:>12.3f}'.format(
+                str(filters), db.session.query(Rotation).count(),
+                n_snapshots, size/1024, elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+"""
+Latency of GET /texts for repeated tag queries served from the query
+result cache vs. computed each time.
+"""
+
+from benchmarks.common import get_bench_app, populate, timeit
+
+from flask_jwt_extended import create_access_token
+
+from memedata.extensions import texts_query_cache
+
+N_TEXTS = 100000
+N_TAGS = 1000
+QUERIES = [
+    'any_tags=tag1',
+    'all_tags=tag1,tag2',
+    'any_tags=tag1,tag2,tag3&max_n_results=1000',
+    'no_tags=tag1&max_n_results=100',
+]
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        populate(N_TEXTS, n_tags=N_TAGS)
+        token = create_access_token('bench')
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+
+    def get(url, clear):
+        if clear:
+            with app.app_context():
+                texts_query_cache.clear()
+        return client.get(url, headers=headers)
+
+    print('{:<44} {:>10} {:>10}'.format('query', 'miss (ms)', 'hit (ms)'))
+    for query in QUERIES:
+        url = '/texts?' + query
+        miss = timeit(lambda: get(url, True), n_runs=5)
+        hit = timeit(lambda: get(url, False), n_runs=50)
+        print('{:<44} {:>10.2f} {:>10.2f}'.format(query, miss, hit))
+    with app.app_context():
+        print(texts_query_cache.stats())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+"""
+Latency of sampling random texts (GET /texts/random internals) on a large
+corpus, cold (ids array built), warm (ids array cached) and right after a
+write (ids array reused for up to TEXT_IDS_MAX_AGE seconds), compared to
+ORDER BY RANDOM().
+"""
+
+import time
+
+from benchmarks.common import get_bench_app, populate, clear, timeit
+
+from sqlalchemy import func
+
+from memedata.database import db
+import memedata.config as config
+from memedata.extensions import text_ids_cache
+from memedata.resources.texts import (
+    TextsRes,
+    TextsRandomRes,
+    bump_texts_generation,
+    text_record_columns,
+    mk_text_records,
+)
+
+CORPUS_SIZE = 1000000
+N = 1
+FILTERS = [
+    {},
+    {'any_tags': ['tag0']},
+    {'all_tags': ['tag0', 'tag1']},
+    {'any_tags': ['tag0'], 'no_tags': ['tag1']},
+]
+
+def order_by_random(args):
+    query = TextsRes.filter_query(
+        db.session.query(*text_record_columns(None)), args)
+    rows = query.order_by(func.random()).limit(args['n']).all()
+    return mk_text_records(rows, None)
+
+def main():
+    app = get_bench_app()
+    app.config['TEXT_IDS_MAX_AGE'] = config.BaseAppConfig.TEXT_IDS_MAX_AGE
+    with app.app_context():
+        clear()
+        start = time.perf_counter()
+        populate(CORPUS_SIZE, n_tags=16, max_n_tags_per_text=4)
+        print('populated {} texts in {:.0f}s'.format(
+            CORPUS_SIZE, time.perf_counter() - start))
+        print('{:>40} {:>10} {:>10} {:>10} {:>12}'.format(
+            'filters', 'cold (ms)', 'warm (ms)', 'write (ms)', 'random (ms)'))
+        for filters in FILTERS:
+            args = dict(filters, n=N, tz='UTC')
+            text_ids_cache.clear()
+            cold = timeit(lambda: TextsRandomRes.sample_texts(args), n_runs=1)
+            warm = timeit(lambda: TextsRandomRes.sample_texts(args), n_runs=100)
+            bump_texts_generation()
+            db.session.commit()
+            write = timeit(lambda: TextsRandomRes.sample_texts(args), n_runs=1)
+            rand = timeit(lambda: order_by_random(args), n_runs=3)
+            print('{:>40} {:>10.2f} {:>10.3f} {:>10.3f} {:>12.2f}'.format(
+                str(filters), cold, warm, write, rand))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+Latency and memory of listing pages of texts (query + dump) through ORM
+objects vs. TextRecords.
+"""
+
+import tracemalloc
+
+from benchmarks.common import get_bench_app, populate, clear, timeit
+
+from sqlalchemy.orm import selectinload
+
+from memedata.database import db
+from memedata.models import Text
+from memedata.resources.texts import TextsRes
+from memedata.serializers import dump_texts
+
+CORPUS_SIZE = 20000
+PAGE_SIZES = [100, 1000, 10000]
+
+def orm_page(n):
+    args = {'offset': 0, 'max_n_results': n}
+    texts, __, __ = TextsRes.filter_texts(
+        args, options=[selectinload(Text.tags)])
+    objs = dump_texts(texts)
+    #identity map is emptied at the end of each request
+    db.session.remove()
+    return objs
+
+def records_page(n):
+    args = {'offset': 0, 'max_n_results': n}
+    texts, __, __ = TextsRes.filter_text_records(args)
+    objs = dump_texts(texts)
+    db.session.remove()
+    return objs
+
+def peak_memory(fn):
+    """
+    Returns peak memory allocated while running fn, in KiB.
+    """
+    tracemalloc.start()
+    fn()
+    __, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak/1024
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        clear()
+        populate(CORPUS_SIZE, n_tags=64, max_n_tags_per_text=6)
+        print('{:>6} {:>10} {:>14} {:>10} {:>14}'.format(
+            'n', 'orm (ms)', 'records (ms)', 'orm (KiB)', 'records (KiB)'))
+        for n in PAGE_SIZES:
+            orm = timeit(lambda: orm_page(n))
+            records = timeit(lambda: records_page(n))
+            orm_mem = peak_memory(lambda: orm_page(n))
+            records_mem = peak_memory(lambda: records_page(n))
+            print('{:>6} {:>10.2f} {:>14.2f} {:>10.0f} {:>14.0f}'.format(
+                n, orm, records, orm_mem, records_mem))
+
+if __name__ == '__main__':
+    main()
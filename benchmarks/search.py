@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""
+Latency of full-text search (GET /texts?q= internals) per backend,
+compared to LIKE scans, and cost of indexing.
+"""
+
+import random
+import time
+
+from benchmarks.common import get_bench_app, clear, timeit
+
+from flask import current_app
+
+from memedata.database import db
+from memedata.models import Text
+from memedata.resources.texts import TextsRes
+from memedata import search
+
+CORPUS_SIZE = 100000
+WORDS = ['bom', 'dia', 'boa', 'tarde', 'noite', 'família', 'amigos', 'deus',
+    'abençoe', 'manhã', 'café', 'sol', 'flores', 'semana', 'feliz', 'sábado']
+QUERIES = [
+    'dia', 'familia abencoe', 'cafe sabado flores', '12345', 'sol 777']
+
+def populate_texts(n, seed=0):
+    rng = random.Random(seed)
+    rows = [{'content': ' '.join(rng.choice(WORDS) for __ in range(8)) \
+        + ' {}'.format(i)} for i in range(n)]
+    db.session.execute(Text.__table__.insert(), rows)
+    db.session.commit()
+
+def like_search(q):
+    query = Text.query
+    for word in q.split():
+        query = query.filter(Text.content.like('%{}%'.format(word)))
+    return query.limit(100).all()
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        for backend in search.BACKENDS:
+            current_app.config['SEARCH_BACKEND'] = backend
+            clear()
+            populate_texts(CORPUS_SIZE)
+            start = time.perf_counter()
+            with db.engine.begin() as conn:
+                search.rebuild_index(conn)
+            print('{}: indexed {} texts in {:.1f}s'.format(
+                backend, CORPUS_SIZE, time.perf_counter() - start))
+            print('{:>20} {:>10} {:>10}'.format('q', 'q (ms)', 'like (ms)'))
+            for q in QUERIES:
+                args = {'q': q, 'offset': 0, 'max_n_results': 100}
+                elapsed = timeit(lambda: TextsRes.filter_text_records(args))
+                like = timeit(lambda: like_search(q))
+                print('{:>20} {:>10.2f} {:>10.2f}'.format(q, elapsed, like))
+
+if __name__ == '__main__':
+    main()
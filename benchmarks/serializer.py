@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+"""
+Serialization time of pages of texts: marshmallow TextSchema vs.
+precompiled dumper, encoded with json and (if installed) orjson.
+"""
+
+import json
+
+from benchmarks.common import get_bench_app, populate, clear, timeit
+
+from sqlalchemy.orm import selectinload
+
+from memedata.models import Text
+from memedata.serializers import TextSchema, dump_texts
+from memedata.representations import orjson
+
+PAGE_SIZES = [100, 1000, 10000]
+
+def main():
+    app = get_bench_app()
+    with app.app_context():
+        clear()
+        populate(max(PAGE_SIZES), n_tags=64, max_n_tags_per_text=6)
+        texts = Text.query.options(selectinload(Text.tags)).all()
+        print('{:>6} {:>14} {:>12} {:>12} {:>12}'.format(
+            'n', 'schema (ms)', 'fast (ms)', '+json (ms)', '+orjson (ms)'))
+        for n in PAGE_SIZES:
+            page = texts[:n]
+            schema = timeit(
+                lambda: TextSchema(many=True).dump(page))
+            fast = timeit(lambda: dump_texts(page))
+            fast_json = timeit(lambda: json.dumps(dump_texts(page)))
+            fast_orjson = timeit(lambda: orjson.dumps(dump_texts(page))) \
+                if orjson is not None else float('nan')
+            print('{:>6} {:>14.2f} {:>12.2f} {:>12.2f} {:>12.2f}'.format(
+                n, schema, fast, fast_json, fast_orjson))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+"""
+Latency of cache hits per backend: memory (per process) vs. sqlite
+(shared by processes on the host), for small values (tag ids, revoked
+tokens) and GET /texts bodies.
+"""
+
+from benchmarks.common import timeit
+
+import os
+import tempfile
+
+from memedata.cache import LRUCache, SqliteCache
+
+N_KEYS = 1000
+BODY_SIZE = 30000
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+    backends = [
+        ('memory', lambda ns: LRUCache(10**9, len)),
+        ('sqlite', lambda ns: SqliteCache(path, ns, 10**9, len)),
+    ]
+    print('{:<8} {:>14} {:>14} {:>14}'.format(
+        'backend', 'get small (us)', 'get_many (us)', 'get body (us)'))
+    for name, mk in backends:
+        small = mk('small')
+        bodies = mk('bodies')
+        keys = ['tag{}'.format(i) for i in range(N_KEYS)]
+        small.set_many({k: b'1' for k in keys})
+        bodies.set('q', b'x'*BODY_SIZE)
+        get_small = timeit(lambda: [small.get(k) for k in keys])/N_KEYS
+        get_many = timeit(lambda: small.get_many(keys[:16]))
+        get_body = timeit(lambda: [bodies.get('q') for __ in range(100)])/100
+        print('{:<8} {:>14.1f} {:>14.1f} {:>14.1f}'.format(
+            name, 1000*get_small, 1000*get_many, 1000*get_body))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+Latency of tags suggestions (GET /tags-suggest internals) from the
+in-memory index vs. a LIKE prefix query ordered by usage.
+"""
+
+from benchmarks.common import get_bench_app, timeit
+
+import random
+
+from memedata.database import db
+from memedata.models import Tag
+from memedata.tag_index import TagIndex
+
+N_TAGS = [1000, 10000, 100000]
+N_RESULTS = 10
+N_PREFIXES = 100
+
+def random_tag(rng):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') \
+        for __ in range(rng.randint(4, 12)))
+
+def like_query(prefix):
+    return db.session.query(Tag.content, Tag.n_texts)\
+        .filter(Tag.content.like(prefix + '%'))\
+        .order_by(Tag.n_texts.desc(), Tag.content)\
+        .limit(N_RESULTS).all()
+
+def main():
+    app = get_bench_app()
+    rng = random.Random(0)
+    print('{:>7} {:>11} {:>11} {:>11}'.format(
+        'n_tags', 'index (ms)', 'fuzzy (ms)', 'like (ms)'))
+    with app.app_context():
+        for n_tags in N_TAGS:
+            counts = {random_tag(rng): rng.randint(0, 1000) \
+                for __ in range(n_tags)}
+            db.session.query(Tag).delete()
+            db.session.execute(Tag.__table__.insert(),
+                [{'content': c, 'n_texts': n} for c, n in counts.items()])
+            db.session.commit()
+            index = TagIndex(counts)
+            prefixes = [c[:rng.randint(1, 4)] \
+                for c in rng.sample(list(counts), N_PREFIXES)]
+
+            def run(fn):
+                return timeit(lambda: [fn(p) for p in prefixes])/N_PREFIXES
+
+            exact = run(lambda p: index.suggest(p, N_RESULTS))
+            fuzzy = run(lambda p: index.suggest(p, N_RESULTS, fuzzy=True))
+            like = run(like_query)
+            print('{:>7} {:>11.3f} {:>11.3f} {:>11.3f}'.format(
+                n_tags, exact, fuzzy, like))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+"""
+Latency of listing tags by usage (GET /tags?sort=-n_texts internals)
+with precomputed counters vs. counting the association table.
+"""
+
+from benchmarks.common import get_bench_app, populate, clear, timeit
+
+from sqlalchemy import func
+
+from memedata.database import db
+from memedata.models import Tag, text_tag_association
+from memedata.resources.tags import TagsRes
+from memedata.setup_db import recount_tags
+
+CORPUS_SIZES = [10000, 100000, 1000000]
+N_TAGS = 1000
+
+def count_query():
+    assoc = text_tag_association
+    n_texts = func.count(assoc.c.text_id)
+    return db.session.query(Tag.content, n_texts)\
+        .outerjoin(assoc, assoc.c.tag_id == Tag.tag_id)\
+        .group_by(Tag.tag_id)\
+        .order_by(n_texts.desc(), Tag.content)\
+        .limit(100).all()
+
+def main():
+    app = get_bench_app()
+    args = {'sort': '-n_texts', 'offset': 0, 'max_n_results': 100}
+    print('{:>8} {:>14} {:>12}'.format('n_texts', 'counters (ms)', 'count (ms)'))
+    with app.app_context():
+        for size in CORPUS_SIZES:
+            clear()
+            populate(size, n_tags=N_TAGS)
+            with db.engine.begin() as conn:
+                recount_tags(conn)
+            counters = timeit(lambda: TagsRes.filter_tags(args))
+            count = timeit(count_query, n_runs=3)
+            print('{:>8} {:>14.2f} {:>12.2f}'.format(size, counters, count))
+
+if __name__ == '__main__':
+    main()
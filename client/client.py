@@ -2,6 +2,8 @@
 Memedata API client.
 '''
 
+import json
+
 import requests
 
 _DEF_IP = '35.226.124.10'
@@ -46,6 +48,13 @@ class Client:
     ENDPOINTS = {
         'login': '/auth/login',
         'texts': '/texts',
+        'texts-batch': '/texts/batch',
+        'texts-export': '/texts/export',
+        'texts-count': '/texts/count',
+        'texts-random': '/texts/random',
+        'texts-next': '/texts/next',
+        'tags': '/tags',
+        'tags-suggest': '/tags-suggest',
         'acc-tok-refresh': '/auth/token/refresh',
     }
 
@@ -111,11 +120,12 @@ class Client:
         self.acc_tok = resp.json()['access_token']
 
     @_refresh_tok_or_login_if_needed
-    def get_texts(self,
+    def get_texts_page(self,
             fields=None,
             date_from=None, date_to=None,
+            datetime_from=None, datetime_to=None, tz=None,
             any_tags=None, all_tags=None, no_tags=None,
-            offset=0, max_n_results=1000
+            offset=0, max_n_results=1000, cursor=None
         ):
         query = [
             'offset={}'.format(offset),
@@ -127,12 +137,20 @@ class Client:
             query.append('date_from={}'.format(date_from))
         if date_to is not None:
             query.append('date_to={}'.format(date_to))
+        if datetime_from is not None:
+            query.append('datetime_from={}'.format(datetime_from))
+        if datetime_to is not None:
+            query.append('datetime_to={}'.format(datetime_to))
+        if tz is not None:
+            query.append('tz={}'.format(tz))
         if any_tags is not None:
             query.append('any_tags={}'.format(Client._format_list(any_tags)))
         if all_tags is not None:
             query.append('all_tags={}'.format(Client._format_list(all_tags)))
         if no_tags is not None:
             query.append('no_tags={}'.format(Client._format_list(no_tags)))
+        if cursor is not None:
+            query.append('cursor={}'.format(cursor))
         query_string = '&'.join(query)
         url = '{}?{}'.format(self.get_endpoint_url('texts'), query_string)
         resp = _get(
@@ -140,7 +158,10 @@ class Client:
             headers=self.get_auth_header(),
         )
         assert resp.status_code == 200
-        return resp.json()['texts']
+        return resp.json()
+
+    def get_texts(self, **kwargs):
+        return self.get_texts_page(**kwargs)['texts']
 
     @_refresh_tok_or_login_if_needed
     def iter_all_texts(self, **kwargs):
@@ -149,12 +170,154 @@ class Client:
         if not 'max_n_results' in kwargs:
             kwargs['max_n_results'] = 1000
         while True:
-            texts = self.get_texts(**kwargs)
+            page = self.get_texts_page(**kwargs)
+            texts = page['texts']
             for txt in texts:
                 yield txt
-            kwargs['offset'] += len(texts)
-            if len(texts) < kwargs['max_n_results']:
-                break
+            if 'next_cursor' in page:
+                #server supports cursors, no need to skip rows with offset
+                if page['next_cursor'] is None:
+                    break
+                kwargs['cursor'] = page['next_cursor']
+                kwargs['offset'] = 0
+            else:
+                kwargs['offset'] += len(texts)
+                if len(texts) < kwargs['max_n_results']:
+                    break
+
+    @_refresh_tok_or_login_if_needed
+    def count_texts(self, approximate=False, **filters):
+        '''
+        gets number of texts matching filters (same as in get_texts).
+        if approximate, a recently counted value may be returned
+        even if texts changed since then.
+        '''
+        params = {k: Client._format_list(v) for k, v in filters.items() \
+            if v is not None}
+        params['approximate'] = 'true' if approximate else 'false'
+        resp = _get(
+            self.get_endpoint_url('texts-count'),
+            params=params,
+            headers=self.get_auth_header(),
+        )
+        assert resp.status_code == 200
+        return resp.json()['n_texts']
+
+    @_refresh_tok_or_login_if_needed
+    def _get_export_response(self, params):
+        resp = _get(
+            self.get_endpoint_url('texts-export'),
+            headers=self.get_auth_header(),
+            params=params,
+            stream=True,
+        )
+        assert resp.status_code == 200
+        return resp
+
+    def export_texts(self, fields=None, **filters):
+        '''
+        generator over all texts matching filters (same as in get_texts),
+        read incrementally from the server stream.
+        '''
+        params = {k: Client._format_list(v) for k, v in filters.items() \
+            if v is not None}
+        if fields is not None:
+            params['fields'] = Client._format_list(fields)
+        resp = self._get_export_response(params)
+        with resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if line:
+                    yield json.loads(line)
+
+    @_refresh_tok_or_login_if_needed
+    def get_random_texts(self, n=1, seed=None, fields=None, **filters):
+        '''
+        gets up to n distinct random texts matching filters
+        (same as in get_texts).
+        '''
+        params = {k: Client._format_list(v) for k, v in filters.items() \
+            if v is not None}
+        params['n'] = n
+        if seed is not None:
+            params['seed'] = seed
+        if fields is not None:
+            params['fields'] = Client._format_list(fields)
+        resp = _get(
+            self.get_endpoint_url('texts-random'),
+            params=params,
+            headers=self.get_auth_header(),
+        )
+        assert resp.status_code == 200
+        return resp.json()['texts']
+
+    @_refresh_tok_or_login_if_needed
+    def get_next_texts(self, consumer, n=1, fields=None, **filters):
+        '''
+        gets up to n texts matching filters (same as in get_texts)
+        not yet handed to consumer in its current cycle.
+        '''
+        params = {k: Client._format_list(v) for k, v in filters.items() \
+            if v is not None}
+        params['consumer'] = consumer
+        params['n'] = n
+        if fields is not None:
+            params['fields'] = Client._format_list(fields)
+        resp = _get(
+            self.get_endpoint_url('texts-next'),
+            params=params,
+            headers=self.get_auth_header(),
+        )
+        assert resp.status_code == 200
+        return resp.json()['texts']
+
+    @_refresh_tok_or_login_if_needed
+    def get_tags(self, sort='content', offset=0, max_n_results=1000):
+        '''
+        gets tags with their number of texts.
+        sort may be content or n_texts, prefixed by - for descending order.
+        '''
+        resp = _get(
+            self.get_endpoint_url('tags'),
+            params={
+                'sort': sort,
+                'offset': offset,
+                'max_n_results': max_n_results,
+            },
+            headers=self.get_auth_header(),
+        )
+        assert resp.status_code == 200
+        return resp.json()['tags']
+
+    @_refresh_tok_or_login_if_needed
+    def suggest_tags(self, prefix, fuzzy=False, max_n_results=10):
+        '''
+        gets tags starting with prefix, most used first.
+        if fuzzy, tags starting with a string one typo away from prefix
+        are also returned.
+        '''
+        resp = _get(
+            self.get_endpoint_url('tags-suggest'),
+            params={
+                'prefix': prefix,
+                'fuzzy': fuzzy,
+                'max_n_results': max_n_results,
+            },
+            headers=self.get_auth_header(),
+        )
+        assert resp.status_code == 200
+        return resp.json()['tags']
+
+    @_refresh_tok_or_login_if_needed
+    def get_tag(self, content):
+        url = '{}/{}'.format(self.get_endpoint_url('tags'), content)
+        resp = _get(
+            url,
+            headers=self.get_auth_header(),
+        )
+        if resp.status_code == 404:
+            raise ValueError('tag {} does not exist'.format(content))
+        assert resp.status_code == 200
+        return resp.json()['tag']
 
     @_refresh_tok_or_login_if_needed
     def get_text(self, text_id):
@@ -178,6 +341,31 @@ class Client:
         assert resp.status_code == 201
         return resp.json()['text']
 
+    @_refresh_tok_or_login_if_needed
+    def post_texts(self, texts, chunk_size=None):
+        '''
+        creates many texts in one request.
+        texts is a list of dicts {'content': ..., 'tags': [...]},
+        tags may also be a comma-separated string.
+        returns list with a text_id or errors for each text, in order.
+        '''
+        url = self.get_endpoint_url('texts-batch')
+        if chunk_size is not None:
+            url = '{}?chunk_size={}'.format(url, chunk_size)
+        items = []
+        for t in texts:
+            tags = t.get('tags', [])
+            if not isinstance(tags, str):
+                tags = list(tags)
+            items.append({'content': t['content'], 'tags': tags})
+        resp = _post(
+            url,
+            headers=self.get_auth_header(),
+            json=items,
+        )
+        assert resp.status_code == 201
+        return resp.json()['texts']
+
     @_refresh_tok_or_login_if_needed
     def update_text(self, text_id, content=None, tags=[]):
         url = '{}/{}'.format(self.get_endpoint_url('texts'), text_id)
@@ -2,9 +2,20 @@
 
 from flask import Flask
 
-from memedata.extensions import db, api, jwt
+from memedata.extensions import (
+    db,
+    api,
+    jwt,
+    tag_id_cache,
+    text_ids_cache,
+    texts_query_cache,
+    text_counts_cache,
+    revoked_tokens_cache,
+    tag_index,
+)
 from memedata import config
 from memedata.errors import register_handlers
+from memedata.compression import register_compression
 
 def get_app(conf_obj=None):
     if conf_obj is None:
@@ -17,12 +28,20 @@ def get_app(conf_obj=None):
     register_extensions(app)
     #error handlers
     register_error_handlers(app)
+    #response compression
+    register_compression(app)
     return app
 
 def register_extensions(app):
     db.init_app(app)
     jwt.init_app(app)
     api.init_app(app)
+    tag_id_cache.init_app(app)
+    text_ids_cache.init_app(app)
+    texts_query_cache.init_app(app)
+    text_counts_cache.init_app(app)
+    revoked_tokens_cache.init_app(app)
+    tag_index.init_app(app)
 
 def register_error_handlers(app):
     register_handlers(app) 
@@ -0,0 +1,501 @@
+"""
+Caches with a common interface (get, get_many, set, set_many, add, clear,
+stats) and interchangeable backends:
+'memory' (per process), 'sqlite' (file shared by processes on the same
+host) and 'redis' (any Redis-compatible server, shared by hosts).
+Config CACHE_BACKEND selects the backend of shareable caches.
+Errors of shared backends are logged and taken as misses: caches only
+save work, they must not fail requests. Writes that must not be lost (e.g.
+token revocations) pass fail_safe=False to get the errors instead.
+"""
+
+from collections import OrderedDict
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+#maximum number of keys per statement
+CHUNK_SIZE = 500
+
+#hits refresh the recency of sqlite entries at most once per this many
+#seconds, so that hot keys do not cost one write per read
+TOUCH_INTERVAL = 1
+
+logger = logging.getLogger(__name__)
+
+def _chunks(lst, size):
+    return [lst[i:i+size] for i in range(0, len(lst), size)]
+
+def _fail_safe(default=None):
+    """
+    Makes method of a shared cache log backend errors (of class attribute
+    ERRORS) and return default() instead of raising, unless called with
+    fail_safe=False.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, fail_safe=True, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            except self.ERRORS:
+                if not fail_safe:
+                    raise
+                logger.warning('cache %s: %s failed', self.namespace,
+                    method.__name__, exc_info=True)
+                return default() if default is not None else None
+        return wrapper
+    return decorator
+
+class LRUCache:
+    """
+    Size-bounded mapping evicting least recently used keys.
+    Size is the number of items or, if sizeof is given, the sum of sizeof
+    of values (e.g. len of bytes values).
+    Keeps hit/miss counters. Thread-safe.
+    """
+    shared = False
+
+    def __init__(self, max_size, sizeof=None):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.n_hits = 0
+        self.n_misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _get(self, key, default):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.n_misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.n_hits += 1
+        return value
+
+    def _sizeof(self, value):
+        return 1 if self.sizeof is None else self.sizeof(value)
+
+    def _set(self, key, value):
+        if key in self._data:
+            self.size -= self._sizeof(self._data[key])
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self.size += self._sizeof(value)
+        while self.size > self.max_size:
+            __, evicted = self._data.popitem(last=False)
+            self.size -= self._sizeof(evicted)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._get(key, default)
+
+    def get_many(self, keys):
+        """
+        Returns dict with the keys found in cache.
+        """
+        missing = object()
+        with self._lock:
+            values = ((k, self._get(k, missing)) for k in keys)
+            return {k: v for k, v in values if v is not missing}
+
+    def set(self, key, value, fail_safe=True):
+        with self._lock:
+            self._set(key, value)
+
+    def set_many(self, dct, fail_safe=True):
+        with self._lock:
+            for k, v in dct.items():
+                self._set(k, v)
+
+    def add(self, key, value):
+        """
+        Sets key only if not in cache.
+        """
+        with self._lock:
+            if not key in self._data:
+                self._set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        n_lookups = self.n_hits + self.n_misses
+        return {
+            'n_items': len(self._data),
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.n_hits,
+            'misses': self.n_misses,
+            'hit_rate': self.n_hits/n_lookups if n_lookups else None,
+        }
+
+class SqliteCache:
+    """
+    Cache in a sqlite file, shared by processes on the same host.
+    Same eviction and sizes as LRUCache, per namespace. Writes (including
+    clear) are seen right away by all processes.
+    Values are pickled, so the file must only be writable by the app.
+    """
+    shared = True
+
+    ERRORS = (sqlite3.Error, pickle.UnpicklingError)
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_namespaces (
+            namespace TEXT PRIMARY KEY,
+            size INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            used_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        );
+        CREATE INDEX IF NOT EXISTS ix_cache_entries_used_at
+            ON cache_entries (namespace, used_at);
+    """
+
+    def __init__(self, path, namespace, max_size, sizeof=None):
+        self.path = path
+        self.namespace = namespace
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.n_hits = 0
+        self.n_misses = 0
+        self._local = threading.local()
+
+    def __len__(self):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM cache_entries WHERE namespace = ?',
+            (self.namespace, )).fetchone()[0]
+
+    def _conn(self):
+        #one connection per thread, reopened in forked processes
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            #entries can always be recomputed
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.executescript(self.SCHEMA)
+            conn.execute('INSERT OR IGNORE INTO cache_namespaces '
+                '(namespace, size) VALUES (?, 0)', (self.namespace, ))
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    @staticmethod
+    def _key(key):
+        return repr(key)
+
+    def _sizeof(self, value):
+        return 1 if self.sizeof is None else self.sizeof(value)
+
+    @_fail_safe(dict)
+    def get_many(self, keys):
+        """
+        Returns dict with the keys found in cache.
+        """
+        keys = list(keys)
+        found = {}
+        stale = []
+        conn = self._conn()
+        now = time.time()
+        for chunk in _chunks(keys, CHUNK_SIZE):
+            skeys = {self._key(k): k for k in chunk}
+            rows = conn.execute(
+                'SELECT key, value, used_at FROM cache_entries '
+                'WHERE namespace = ? AND key IN ({})'.format(
+                    ', '.join('?'*len(skeys))),
+                [self.namespace] + list(skeys))
+            for skey, value, used_at in rows:
+                found[skeys[skey]] = pickle.loads(value)
+                if now - used_at >= TOUCH_INTERVAL:
+                    stale.append(skey)
+        if stale:
+            conn.executemany('UPDATE cache_entries SET used_at = ? '
+                'WHERE namespace = ? AND key = ?',
+                [(now, self.namespace, k) for k in stale])
+        self.n_hits += len(found)
+        self.n_misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    @_fail_safe()
+    def _set_many(self, dct, replace=True):
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            delta = 0
+            for key, value in dct.items():
+                skey = self._key(key)
+                row = conn.execute('SELECT size FROM cache_entries '
+                    'WHERE namespace = ? AND key = ?',
+                    (self.namespace, skey)).fetchone()
+                if row is not None and not replace:
+                    continue
+                size = self._sizeof(value)
+                conn.execute('INSERT OR REPLACE INTO cache_entries '
+                    '(namespace, key, value, size, used_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (self.namespace, skey,
+                        pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                        size, now))
+                delta += size - (row[0] if row is not None else 0)
+            conn.execute('UPDATE cache_namespaces SET size = size + ? '
+                'WHERE namespace = ?', (delta, self.namespace))
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn):
+        size, = conn.execute(
+            'SELECT size FROM cache_namespaces WHERE namespace = ?',
+            (self.namespace, )).fetchone()
+        while size > self.max_size:
+            rows = conn.execute('SELECT key, size FROM cache_entries '
+                'WHERE namespace = ? ORDER BY used_at LIMIT ?',
+                (self.namespace, CHUNK_SIZE)).fetchall()
+            if not rows:
+                size = 0
+            evicted = []
+            for key, entry_size in rows:
+                if size <= self.max_size:
+                    break
+                evicted.append(key)
+                size -= entry_size
+            conn.executemany(
+                'DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                [(self.namespace, k) for k in evicted])
+            conn.execute(
+                'UPDATE cache_namespaces SET size = ? WHERE namespace = ?',
+                (size, self.namespace))
+
+    def set(self, key, value, fail_safe=True):
+        self._set_many({key: value}, fail_safe=fail_safe)
+
+    def set_many(self, dct, fail_safe=True):
+        self._set_many(dct, fail_safe=fail_safe)
+
+    def add(self, key, value):
+        """
+        Sets key only if not in cache.
+        """
+        self._set_many({key: value}, replace=False)
+
+    @_fail_safe()
+    def clear(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ?',
+                (self.namespace, ))
+            conn.execute('UPDATE cache_namespaces SET size = 0 '
+                'WHERE namespace = ?', (self.namespace, ))
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    @_fail_safe(lambda: (None, None))
+    def _count(self):
+        size, = self._conn().execute(
+            'SELECT size FROM cache_namespaces WHERE namespace = ?',
+            (self.namespace, )).fetchone()
+        return len(self), size
+
+    def stats(self):
+        n_lookups = self.n_hits + self.n_misses
+        n_items, size = self._count()
+        return {
+            'n_items': n_items,
+            'size': size,
+            'max_size': self.max_size,
+            'hits': self.n_hits,
+            'misses': self.n_misses,
+            'hit_rate': self.n_hits/n_lookups if n_lookups else None,
+        }
+
+class RedisCache:
+    """
+    Cache in a Redis server (or any client with the same get/mget/set/
+    incr/pipeline methods), shared by processes on any host.
+    Entries expire ttl seconds after being set, which bounds the total size
+    by the write rate (besides the server maxmemory); values larger than
+    max_size (as measured by sizeof) are not kept.
+    Keys include a namespace version, bumped by clear, so cleared entries
+    are unreachable right away and left to expire.
+    """
+    shared = True
+
+    ERRORS = (redis.RedisError, ) if redis is not None else ()
+
+    def __init__(self, client, namespace, max_size=None, sizeof=None,
+            ttl=3600):
+        self.client = client
+        self.namespace = namespace
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.n_hits = 0
+        self.n_misses = 0
+        self._version_key = 'memedata:{}:version'.format(namespace)
+
+    def _keys(self, keys):
+        version = int(self.client.get(self._version_key) or 0)
+        return ['memedata:{}:{}:{}'.format(self.namespace, version,
+            hashlib.sha1(repr(k).encode('utf-8')).hexdigest()) for k in keys]
+
+    def _fits(self, value):
+        if self.max_size is None:
+            return True
+        size = 1 if self.sizeof is None else self.sizeof(value)
+        return size <= self.max_size
+
+    @_fail_safe(dict)
+    def get_many(self, keys):
+        """
+        Returns dict with the keys found in cache.
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.client.mget(self._keys(keys))
+        found = {k: pickle.loads(v) for k, v in zip(keys, values) \
+            if v is not None}
+        self.n_hits += len(found)
+        self.n_misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    @_fail_safe()
+    def set_many(self, dct):
+        dct = {k: v for k, v in dct.items() if self._fits(v)}
+        if not dct:
+            return
+        pipe = self.client.pipeline()
+        for rkey, value in zip(self._keys(dct), dct.values()):
+            pipe.set(rkey, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                ex=self.ttl)
+        pipe.execute()
+
+    def set(self, key, value, fail_safe=True):
+        self.set_many({key: value}, fail_safe=fail_safe)
+
+    @_fail_safe()
+    def add(self, key, value):
+        """
+        Sets key only if not in cache.
+        """
+        if not self._fits(value):
+            return
+        rkey, = self._keys([key])
+        self.client.set(rkey, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            nx=True, ex=self.ttl)
+
+    @_fail_safe()
+    def clear(self):
+        self.client.incr(self._version_key)
+
+    def stats(self):
+        n_lookups = self.n_hits + self.n_misses
+        return {
+            'n_items': None,
+            'size': None,
+            'max_size': self.max_size,
+            'hits': self.n_hits,
+            'misses': self.n_misses,
+            'hit_rate': self.n_hits/n_lookups if n_lookups else None,
+        }
+
+def mk_cache(config, namespace, max_size, sizeof=None):
+    """
+    Creates cache with backend given by config CACHE_BACKEND.
+    """
+    backend = config.get('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        return LRUCache(max_size, sizeof)
+    if backend == 'sqlite':
+        return SqliteCache(
+            config['CACHE_SQLITE_PATH'], namespace, max_size, sizeof)
+    if backend == 'redis':
+        client = config.get('CACHE_REDIS_CLIENT')
+        if client is None:
+            if redis is None:
+                raise ValueError('redis cache backend requires redis')
+            client = redis.Redis.from_url(config['CACHE_REDIS_URL'])
+        return RedisCache(client, namespace, max_size, sizeof,
+            ttl=config.get('CACHE_REDIS_TTL', 3600))
+    raise ValueError('unknown cache backend \'{}\''.format(backend))
+
+class AppCache:
+    """
+    Flask extension keeping one cache per app, sized by config_key.
+    Shareable caches use the backend of config CACHE_BACKEND, others are
+    always kept in memory.
+    Namespaces of shared backends are suffixed by scope() (e.g. an id of
+    the database), called on first use of the cache in each app, so that
+    apps of different scopes never see each other's entries.
+    """
+    def __init__(self, name, config_key, default_max_size=1024, sizeof=None,
+            shareable=True, scope=None):
+        self.name = name
+        self.config_key = config_key
+        self.default_max_size = default_max_size
+        self.sizeof = sizeof
+        self.shareable = shareable
+        self.scope = scope
+
+    def _mk_cache(self, config, namespace):
+        max_size = config.get(self.config_key, self.default_max_size)
+        if self.shareable:
+            return mk_cache(config, namespace, max_size, self.sizeof)
+        return LRUCache(max_size, self.sizeof)
+
+    def init_app(self, app):
+        if self.shareable and self.scope is not None \
+                and app.config.get('CACHE_BACKEND', 'memory') != 'memory':
+            #created on first use, when the scope can be computed
+            app.extensions[self.name] = None
+        else:
+            app.extensions[self.name] = self._mk_cache(app.config, self.name)
+
+    @property
+    def cache(self):
+        cache = current_app.extensions[self.name]
+        if cache is None:
+            namespace = '{}:{}'.format(self.name, self.scope())
+            cache = self._mk_cache(current_app.config, namespace)
+            current_app.extensions[self.name] = cache
+        return cache
+
+    def __getattr__(self, attr):
+        return getattr(self.cache, attr)
@@ -0,0 +1,72 @@
+"""
+Negotiated compression (brotli, if installed, or gzip) of responses.
+
+Compressed responses get weak entity tags: their bytes differ from the
+identity encoding, but they are the same representation, and
+If-None-Match uses weak comparison anyway.
+"""
+
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+def accepted_encoding(req):
+    """
+    Gets best content encoding accepted by request, None for identity.
+    """
+    if brotli is not None and req.accept_encodings['br']:
+        return 'br'
+    if req.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    """
+    Gets (applied encoding, data) of body compressed with encoding,
+    if it is at least config COMPRESS_MIN_SIZE bytes long.
+    """
+    config = current_app.config
+    if encoding is None or len(body) < config['COMPRESS_MIN_SIZE']:
+        return None, body
+    if encoding == 'br':
+        return 'br', brotli.compress(body, quality=config['COMPRESS_BR_LEVEL'])
+    return 'gzip', gzip.compress(body, config['COMPRESS_LEVEL'])
+
+def set_content_encoding(resp, encoding):
+    """
+    Sets headers of response with data in content encoding.
+    """
+    resp.vary.add('Accept-Encoding')
+    if encoding is None:
+        return
+    resp.headers['Content-Encoding'] = encoding
+    etag, weak = resp.get_etag()
+    if etag is not None and not weak:
+        resp.set_etag(etag, weak=True)
+
+def compress_response(resp):
+    """
+    Compresses complete responses of compressible types, unless encoding
+    was already negotiated (e.g. for pre-compressed cached bodies).
+    """
+    if resp.mimetype not in COMPRESSIBLE_MIMETYPES \
+            or resp.direct_passthrough or resp.is_streamed \
+            or 'Accept-Encoding' in resp.vary:
+        return resp
+    encoding = None
+    if resp.status_code == 200:
+        encoding, data = compress(resp.get_data(), accepted_encoding(request))
+        if encoding is not None:
+            resp.set_data(data)
+    set_content_encoding(resp, encoding)
+    return resp
+
+def register_compression(app):
+    app.after_request(compress_response)
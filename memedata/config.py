@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 app_name = 'memedata'
 
@@ -35,6 +36,40 @@ class BaseAppConfig:
     JWT_BLACKLIST_ENABLED = True
     JWT_BLACKLIST_TOKEN_CHECKS = ['access', 'refresh']
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    #'memory' (per process), 'sqlite' (CACHE_SQLITE_PATH, shared by
+    #processes on the host) or 'redis' (CACHE_REDIS_URL, needs redis)
+    CACHE_BACKEND = 'memory'
+    CACHE_SQLITE_PATH = os.path.join(
+        tempfile.gettempdir(), 'memedata-cache.db')
+    CACHE_REDIS_URL = 'redis://localhost:6379/0'
+    #seconds until entries of the redis backend expire
+    CACHE_REDIS_TTL = 3600
+    TAG_ID_CACHE_MAX_SIZE = 4096
+    REVOKED_TOKENS_CACHE_MAX_SIZE = 65536
+    #bytes of arrays of text ids kept in memory (8 per id)
+    TEXT_IDS_CACHE_MAX_SIZE = 256*2**20
+    TEXT_COUNTS_CACHE_MAX_SIZE = 4096
+    #seconds /texts/random may sample from ids of texts selected before
+    #writes, instead of selecting them again after every write
+    TEXT_IDS_MAX_AGE = 60
+    #seconds approximate counts (/texts/count?approximate=true) may lag
+    #behind writes
+    TEXT_COUNTS_MAX_AGE = 300
+    #bytes of json bodies of GET /texts kept in cache
+    TEXTS_QUERY_CACHE_MAX_SIZE = 64*2**20
+    #seconds until tags counts (and tags of other processes) show up in
+    #/tags-suggest
+    TAG_INDEX_TTL = 60
+    #full-text search backend ('fts5', 'terms'), None picks one for database
+    SEARCH_BACKEND = None
+    #encode responses with orjson, if installed
+    FAST_JSON = False
+    #json responses of at least this many bytes are compressed (brotli,
+    #if installed, or gzip) for clients accepting it
+    COMPRESS_MIN_SIZE = 1024
+    #gzip level (1-9) and brotli quality (0-11)
+    COMPRESS_LEVEL = 6
+    COMPRESS_BR_LEVEL = 5
 
 def get_app_config_class(**override_environ):
     conf = os.environ.copy()
@@ -49,6 +84,13 @@ def get_app_config_class(**override_environ):
             'MEMEDATA_JWT_SECRET_KEY', 'jwtsecret', conf)
         SQLALCHEMY_DATABASE_URI = _get_var(
             'MEMEDATA_DB_PATH', 'sqlite:////tmp/memedatadev.db', conf)
+        #optional, also in production
+        CACHE_BACKEND = conf.get(
+            'MEMEDATA_CACHE_BACKEND', BaseAppConfig.CACHE_BACKEND)
+        CACHE_SQLITE_PATH = conf.get(
+            'MEMEDATA_CACHE_SQLITE_PATH', BaseAppConfig.CACHE_SQLITE_PATH)
+        CACHE_REDIS_URL = conf.get(
+            'MEMEDATA_CACHE_REDIS_URL', BaseAppConfig.CACHE_REDIS_URL)
         SQLALCHEMY_TRACK_MODIFICATIONS = _is_prod()
     return AppConfig
 
@@ -63,4 +105,6 @@ def get_app_test_config_class(**override_environ):
         JWT_SECRET_KEY = 'jwtsecret'
         SQLALCHEMY_DATABASE_URI = os.environ.get(
             'MEMEDATA_TEST_DB_PATH', 'sqlite://')
+        #writes show up in samples right away
+        TEXT_IDS_MAX_AGE = 0
     return AppTestConfig
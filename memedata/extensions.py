@@ -1,16 +1,112 @@
+import hashlib
+import sqlite3
+import sys
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_sqlalchemy import SQLAlchemy
 from flask_restful import Api
 from flask_jwt_extended import JWTManager
 
+from memedata.cache import AppCache
+from memedata.tag_index import AppTagIndex
+from memedata.representations import output_json
+
 db = SQLAlchemy()
 
+@event.listens_for(Engine, 'connect')
+def disable_pysqlite_transactions(dbapi_connection, connection_record):
+    """
+    pysqlite begins transactions only before DML and commits before DDL,
+    so savepoints (and DDL) would not run in the session transaction.
+    Transactions are begun by begin_sqlite_transaction instead.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.isolation_level = None
+
+@event.listens_for(Engine, 'begin')
+def begin_sqlite_transaction(conn):
+    #on the DBAPI connection, as other drivers begin implicitly too
+    if conn.dialect.name == 'sqlite':
+        conn.connection.execute('BEGIN')
+
 jwt = JWTManager()
 
-from memedata.resources import texts, images, auth
+def database_id():
+    """
+    Digest of URI and random id (drawn at creation) of the database, which
+    shared caches are scoped by: entries of a database must not be seen by
+    apps of another one (or of a recreated one) sharing the cache backend.
+    """
+    value = db.session.execute(
+        "SELECT value FROM generations WHERE name = 'database'").scalar()
+    ident = '{} {}'.format(db.engine.url, value)
+    return hashlib.sha1(ident.encode('utf-8')).hexdigest()[:16]
+
+def text_ids_sizeof(entry):
+    """
+    Bytes of the ids array of a text_ids_cache entry (of either kind),
+    overhead included so that empty arrays count too.
+    """
+    ids = entry[-1] if isinstance(entry, tuple) else entry
+    return sys.getsizeof(ids)
+
+#tag content -> tag_id
+tag_id_cache = AppCache('tag_id_cache', 'TAG_ID_CACHE_MAX_SIZE', 4096,
+    scope=database_id)
+#texts filters -> (texts generation, time, sorted text ids), and
+#('snapshot', digest) -> ids of /texts/next cycles; arrays are large, so
+#kept in memory and sized in bytes
+text_ids_cache = AppCache('text_ids_cache', 'TEXT_IDS_CACHE_MAX_SIZE',
+    256*2**20, sizeof=text_ids_sizeof, shareable=False)
+#(texts generation, json encoder, GET /texts args, accepted encoding) ->
+#(content encoding, json body), sized in bytes of (compressed) bodies
+texts_query_cache = AppCache(
+    'texts_query_cache', 'TEXTS_QUERY_CACHE_MAX_SIZE', 64*2**20,
+    sizeof=lambda entry: len(entry[1]), scope=database_id)
+#texts filters -> (texts generation, time, number of texts)
+text_counts_cache = AppCache(
+    'text_counts_cache', 'TEXT_COUNTS_CACHE_MAX_SIZE', 4096,
+    scope=database_id)
+#token jti -> whether it was revoked
+revoked_tokens_cache = AppCache(
+    'revoked_tokens_cache', 'REVOKED_TOKENS_CACHE_MAX_SIZE', 65536,
+    scope=database_id)
+#caches reported by /caches
+caches = [
+    tag_id_cache,
+    text_ids_cache,
+    texts_query_cache,
+    text_counts_cache,
+    revoked_tokens_cache,
+]
+
+def load_tag_counts():
+    rows = db.session.execute('SELECT content, n_texts FROM tags')
+    return {content: n_texts for content, n_texts in rows}
+
+#tags contents and counts for /tags-suggest
+tag_index = AppTagIndex('tag_index', 'TAG_INDEX_TTL', load_tag_counts)
+
+from memedata.resources import texts, tags, images, auth
+from memedata.resources import caches as caches_res
 api = Api()
+api.representation('application/json')(output_json)
 #texts
 api.add_resource(texts.TextsRes, '/texts')
+api.add_resource(texts.TextsBatchRes, '/texts/batch')
+api.add_resource(texts.TextsExportRes, '/texts/export')
+api.add_resource(texts.TextsCountRes, '/texts/count')
+api.add_resource(texts.TextsRandomRes, '/texts/random')
+api.add_resource(texts.TextsNextRes, '/texts/next')
 api.add_resource(texts.TextRes, '/texts/<int:text_id>')
+#tags
+api.add_resource(tags.TagsRes, '/tags')
+api.add_resource(tags.TagRes, '/tags/<string:content>')
+#outside of /tags/, where it would shadow a tag named 'suggest'
+api.add_resource(tags.TagsSuggestRes, '/tags-suggest')
+#caches
+api.add_resource(caches_res.CachesRes, '/caches')
 #images
 api.add_resource(images.ImagesRes, '/images')
 api.add_resource(images.ImageRes, '/images/<int:uid>')
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+"""
+Bulk import of texts (and their tags) into the database.
+
+Texts files may be NDJSON (.ndjson/.jsonl, one {"content": ..., "tags": ...}
+object per line) or plain text (one text per line).
+Tags files have one or more comma-separated tags per line.
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+
+from marshmallow import ValidationError
+
+from memedata.app import get_app
+from memedata.database import db
+from memedata.models import Text, text_tag_association
+from memedata.resources.texts import (
+    TextsRes,
+    validate_tags,
+    get_tag_ids,
+    insert_text_rows,
+    update_tag_counts,
+    bump_texts_generation,
+)
+from memedata.util import chunks
+from memedata import search
+import memedata.config as config
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+#maximum number of tags resolved per query
+TAGS_CHUNK_SIZE = 500
+
+MAX_CONTENT_LEN = Text.__table__.c.content.type.length
+
+def read_lines(path):
+    """
+    Yields (line number, line) of non-empty lines in file.
+    """
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if line:
+                yield i + 1, line
+
+def read_tags_files(paths, errors):
+    """
+    Gets valid tags from tags files,
+    appending (path, line number, message) of invalid ones to errors.
+    """
+    tags = set()
+    for path in paths:
+        for line_number, line in read_lines(path):
+            line_tags = [t.strip() for t in line.split(',') if t.strip()]
+            try:
+                validate_tags(line_tags)
+            except ValidationError as e:
+                errors.append((path, line_number, str(e.messages)))
+                continue
+            tags.update(line_tags)
+    return tags
+
+def parse_item(line, ndjson):
+    """
+    Gets (content, tags) from line of texts file.
+    """
+    if not ndjson:
+        return line, []
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        raise ValidationError('invalid json')
+    if not isinstance(obj, dict):
+        raise ValidationError('text must be an object')
+    tags = obj.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return obj.get('content'), tags
+
+def validate_item(content, tags, valid_tags):
+    """
+    Validates item. Tags in set valid_tags are known to be valid,
+    new valid tags are added to it.
+    """
+    if not isinstance(content, str):
+        raise ValidationError('content must be a string')
+    if len(content) > MAX_CONTENT_LEN:
+        raise ValidationError('content too long')
+    TextsRes.check_post_tags(tags)
+    new_tags = [t for t in tags if not t in valid_tags]
+    if new_tags:
+        validate_tags(new_tags)
+        valid_tags.update(new_tags)
+
+def iter_valid_items(paths, errors):
+    """
+    Yields valid (content, tags) from texts files,
+    appending (path, line number, message) of invalid ones to errors.
+    """
+    valid_tags = set()
+    for path in paths:
+        ndjson = path.endswith(NDJSON_EXTENSIONS)
+        for line_number, line in read_lines(path):
+            try:
+                content, tags = parse_item(line, ndjson)
+                validate_item(content, tags, valid_tags)
+            except ValidationError as e:
+                errors.append((path, line_number, str(e.messages)))
+                continue
+            yield content, tags
+
+def resolve_tags(contents):
+    """
+    Gets mapping content -> tag_id for all contents, creating missing tags.
+    """
+    contents = sorted(set(contents))
+    tag_ids = {}
+    for chunk in chunks(contents, TAGS_CHUNK_SIZE):
+        tag_ids.update(zip(chunk, get_tag_ids(chunk)))
+    db.session.commit()
+    return tag_ids
+
+def insert_chunk(items, tag_ids):
+    """
+    Inserts chunk of (content, tags) with few statements for texts and one
+    for associations (plus tags counters and search index entries), in a
+    single transaction.
+    """
+    contents = [content for content, __ in items]
+    text_ids = insert_text_rows(contents)
+    assoc_rows = []
+    for text_id, (__, tags) in zip(text_ids, items):
+        assoc_rows.extend(
+            {'text_id': text_id, 'tag_id': tag_ids[t]} for t in set(tags))
+    if assoc_rows:
+        db.session.execute(text_tag_association.insert(), assoc_rows)
+    update_tag_counts(Counter(r['tag_id'] for r in assoc_rows))
+    search.index_texts(zip(text_ids, contents))
+    bump_texts_generation()
+    db.session.commit()
+
+def import_texts(app, texts_paths, tags_paths=(), chunk_size=10000,
+        verbose=False):
+    """
+    Imports texts files into database.
+    Returns number of imported texts and list of errors.
+    """
+    start = time.perf_counter()
+    with app.app_context():
+        #first pass: all tags are resolved at once
+        errors = []
+        tags = read_tags_files(tags_paths, errors)
+        for __, item_tags in iter_valid_items(texts_paths, []):
+            tags.update(item_tags)
+        tag_ids = resolve_tags(tags)
+        if verbose:
+            print('resolved {} tags'.format(len(tag_ids)))
+
+        #second pass: texts inserted in chunks
+        n_texts = 0
+        chunk = []
+        for item in iter_valid_items(texts_paths, errors):
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                insert_chunk(chunk, tag_ids)
+                n_texts += len(chunk)
+                chunk = []
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print('imported {} texts ({:.0f} texts/s)'.format(
+                        n_texts, n_texts/elapsed))
+        if chunk:
+            insert_chunk(chunk, tag_ids)
+            n_texts += len(chunk)
+    return n_texts, errors
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='bulk import texts into the database')
+    parser.add_argument(
+        'texts',
+        nargs='+',
+        help='texts files (.ndjson/.jsonl or one text per line)',
+    )
+    parser.add_argument(
+        '--tags',
+        nargs='*',
+        help='tags files (comma-separated tags) with tags to create',
+        default=[],
+    )
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        help='number of texts inserted per transaction',
+        default=10000,
+    )
+    args = parser.parse_args()
+
+    app = get_app()
+
+    print('importing for env "{}"'.format(config.env))
+    start = time.perf_counter()
+    n_texts, errors = import_texts(
+        app, args.texts, args.tags, args.chunk_size, verbose=True)
+    elapsed = time.perf_counter() - start
+    for path, line_number, message in errors:
+        print('skipped {}:{}: {}'.format(path, line_number, message))
+    print('done. imported {} texts in {:.2f}s ({:.0f} texts/s), {} errors.'\
+        .format(n_texts, elapsed, n_texts/max(elapsed, 1e-9), len(errors)))
+
+if __name__ == '__main__':
+    main()
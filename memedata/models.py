@@ -1,3 +1,8 @@
+import random
+
+from sqlalchemy import event
+from sqlalchemy.dialects import sqlite
+
 from memedata.database import db
 from memedata.util import generate_hash
 
@@ -6,27 +11,48 @@ Integer = db.Integer
 String = db.String
 Text = db.Text
 DateTime = db.DateTime
+LargeBinary = db.LargeBinary
 Table = db.Table
+Index = db.Index
 ForeignKey = db.ForeignKey
 func = db.func
 relationship = db.relationship
 Base = db.Model
 Table = db.Table
 
+#sqlite stores func.now() with second precision and without microseconds,
+#so bound timestamps must use the same format to compare equal
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format='%(year)04d-%(month)02d-%(day)02d '\
+            '%(hour)02d:%(minute)02d:%(second)02d'),
+    'sqlite')
+
 text_tag_association = Table('association', Base.metadata,
-    Column('text_id', Integer, ForeignKey('texts.text_id')),
-    Column('tag_id', Integer, ForeignKey('tags.tag_id'))
+    Column('text_id', Integer, ForeignKey('texts.text_id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.tag_id'), primary_key=True),
+    #primary key serves lookups by text, this one serves lookups by tag
+    Index('ix_association_tag_id_text_id', 'tag_id', 'text_id'),
 )
 
 class Text(Base):
     __tablename__ = 'texts'
     text_id = Column(Integer, primary_key=True)
     content = Column(String(2049), unique=False, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
+    #bumped along with updated_at, which can not tell apart updates within
+    #the same second on sqlite
+    version = Column(Integer, nullable=False, default=1, server_default='1',
+        onupdate=db.literal_column('version') + 1)
     tags = relationship(
         'Tag', secondary=text_tag_association, back_populates='texts')
 
+    #same ordering as texts listing
+    __table_args__ = (
+        Index('ix_texts_created_at_text_id', created_at.desc(), text_id),
+    )
+
     def __init__(self, content='', tags=[]):
         self.content = content
         self.tags = tags
@@ -34,21 +60,106 @@ class Text(Base):
     def __repr__(self):
         return '<Text %r>' % (self.content)
 
+    @property
+    def tag_contents(self):
+        return [t.content for t in self.tags]
+
+class TextRecord:
+    """
+    Read-only text row, without ORM bookkeeping, for listings.
+    """
+    __slots__ = (
+        'text_id', 'content', 'created_at', 'updated_at', 'tag_contents')
+
+    def __init__(self, text_id, content=None, created_at=None,
+            updated_at=None, tag_contents=None):
+        self.text_id = text_id
+        self.content = content
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.tag_contents = tag_contents
+
+    def __repr__(self):
+        return '<TextRecord %r>' % (self.content)
+
 class Tag(Base):
     __tablename__ = 'tags'
     tag_id = Column(Integer, primary_key=True)
     content = Column(String(32), unique=True, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(Timestamp, server_default=func.now())
+    updated_at = Column(Timestamp, onupdate=func.now())
+    #number of texts with tag, kept up to date by text writes
+    n_texts = Column(Integer, nullable=False, default=0, server_default='0')
     texts = relationship(
         'Text', secondary=text_tag_association, back_populates='tags')
 
+    __table_args__ = (
+        Index('ix_tags_n_texts', n_texts),
+    )
+
     def __init__(self, content=None):
         self.content = content
 
     def __repr__(self):
         return '<Tag {} (id={})>'.format(self.content, self.tag_id)
 
+class Snapshot(Base):
+    """
+    Sorted ids of texts matching some filters when a rotation cycle started
+    (packed, with digest of the unpacked ids). Stored once for all
+    rotations walking it and deleted when none does anymore.
+    """
+    __tablename__ = 'snapshots'
+    digest = Column(String(40), primary_key=True)
+    n_ids = Column(Integer, nullable=False)
+    ids = Column(LargeBinary, nullable=False)
+    created_at = Column(Timestamp, server_default=func.now())
+
+class Rotation(Base):
+    """
+    Position of a consumer in a non-repeating walk over texts matching
+    some filters. A cycle visits the n_ids ids of the snapshot with digest
+    ids_digest in the order given by permute(position, n_ids, seed),
+    skipping ids of texts that no longer exist or match.
+    """
+    __tablename__ = 'rotations'
+    consumer = Column(String(128), primary_key=True)
+    #hash of filters
+    filters = Column(String(40), primary_key=True)
+    cycle = Column(Integer, nullable=False)
+    seed = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False)
+    ids_digest = Column(String(40), nullable=False)
+    updated_at = Column(
+        Timestamp, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        #lookups of snapshots still in use
+        Index('ix_rotations_ids_digest', ids_digest),
+    )
+
+class Generation(Base):
+    """
+    Counter bumped in the same transaction as the writes it tracks, so that
+    readers in any process can tell whether data changed since they last
+    looked. 'texts' tracks texts and their tags.
+    The 'database' row is not bumped: its value is a random id drawn when
+    the table is created, which tells apart databases sharing caches.
+    """
+    __tablename__ = 'generations'
+    name = Column(String(32), primary_key=True)
+    value = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(
+        Timestamp, server_default=func.now(), onupdate=func.now())
+
+GENERATIONS = ['texts']
+
+@event.listens_for(Generation.__table__, 'after_create')
+def insert_generations(target, conn, **kwargs):
+    conn.execute(target.insert(), [{'name': n} for n in GENERATIONS])
+    conn.execute(target.insert(),
+        {'name': 'database', 'value': random.randint(1, 2**31 - 1)})
+
 class User(Base):
     __tablename__ = 'users'
     user_id = Column(Integer, primary_key=True)
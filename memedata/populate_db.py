@@ -2,11 +2,18 @@
 
 from memedata import app
 from memedata.database import db
-from memedata.models import Text, Tag, User
+from memedata.models import Text, Tag, User, text_tag_association
+from memedata.util import generate_hash
+from memedata import search
+from memedata.resources.texts import (
+    update_tag_counts,
+    bump_texts_generation,
+)
 from memedata import config
 import uuid
 import random
 import os
+from collections import Counter
 
 SENTENCES_FILES = [
     os.path.join('data', 'sentences.txt'),
@@ -52,6 +59,9 @@ def populate_texts(size):
     texts = [get_text() for __ in range(size)]
     with get_app().app_context():
         db.session.add_all(texts)
+        db.session.flush()
+        search.index_texts((t.text_id, t.content) for t in texts)
+        bump_texts_generation()
         db.session.commit()
 
 def populate_texts_with_sentences():
@@ -60,6 +70,9 @@ def populate_texts_with_sentences():
         texts = [Text(l) for l in lines if l]
         with get_app().app_context():
             db.session.add_all(texts)
+            db.session.flush()
+            search.index_texts((t.text_id, t.content) for t in texts)
+            bump_texts_generation()
             db.session.commit()
 
 def populate_tags(size, gibberish=False):
@@ -73,19 +86,24 @@ def sample(iterable, n):
 
 def assign_texts_tags(max_n_tags=5):
     with get_app().app_context():
-        texts = Text.query.all()
-        tags = Tag.query.all()
-        for text in texts:
-            tags_ = sample(tags, random.randint(0, max_n_tags))
-            text.tags.extend(tags_)
-        db.session.add_all(texts)
+        text_ids = [i for i, in db.session.query(Text.text_id)]
+        tag_ids = [i for i, in db.session.query(Tag.tag_id)]
+        rows = []
+        for text_id in text_ids:
+            tag_ids_ = sample(tag_ids, random.randint(0, max_n_tags))
+            rows.extend({'text_id': text_id, 'tag_id': i} for i in tag_ids_)
+        if rows:
+            db.session.execute(text_tag_association.insert(), rows)
+        update_tag_counts(Counter(r['tag_id'] for r in rows))
+        bump_texts_generation()
         db.session.commit()
 
 def populate_users():
     users = [l.split(',') for l in read_lines(USERS_FILE)]
     with get_app().app_context():
-        for name, passwd in users:
-            User.create_and_save(name, passwd)
+        db.session.add_all([User(username=name, password=generate_hash(passwd))\
+            for name, passwd in users])
+        db.session.commit()
 
 def main():
     print('generating for env "{}"'.format(config.env))
@@ -0,0 +1,46 @@
+from flask import make_response, current_app
+from flask_restful.representations.json import output_json as _output_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_encoder():
+    """
+    Gets name of encoder used by output_json.
+    """
+    if orjson is None or not current_app.config.get('FAST_JSON'):
+        return 'json'
+    return 'orjson'
+
+def output_json(data, code, headers=None):
+    """
+    JSON representation. Uses orjson (if installed) when config FAST_JSON
+    is set, falling back to flask-restful's encoder otherwise.
+    Output differs from the default only in whitespace and in non-ascii
+    characters being sent as utf-8 instead of escaped.
+    """
+    if json_encoder() != 'orjson':
+        return _output_json(data, code, headers)
+    option = orjson.OPT_APPEND_NEWLINE
+    if current_app.debug:
+        option |= orjson.OPT_INDENT_2
+    resp = make_response(orjson.dumps(data, option=option), code)
+    resp.headers.extend(headers or {})
+    return resp
+
+def encode_json(data):
+    """
+    Gets body of output_json response for data.
+    """
+    return output_json(data, 200).get_data()
+
+def mk_json_response(body, code, headers=None):
+    """
+    Response with already encoded json body.
+    """
+    resp = make_response(body, code)
+    resp.headers.extend(headers or {})
+    resp.mimetype = 'application/json'
+    return resp
@@ -32,7 +32,7 @@ from memedata.util import (
 
 from memedata.models import User, RevokedToken
 from memedata.database import db
-from memedata.extensions import jwt
+from memedata.extensions import jwt, revoked_tokens_cache
 from memedata import config
 
 _USER_PASS_ARGS = {
@@ -305,7 +305,21 @@ class TokenRefresh(Resource):
 @jwt.token_in_blacklist_loader
 def check_if_token_in_blacklist(decrypted_token):
     jti = decrypted_token['jti']
-    return RevokedToken.is_jti_blacklisted(jti)
+    revoked = revoked_tokens_cache.get(jti)
+    if revoked is None:
+        revoked = RevokedToken.is_jti_blacklisted(jti)
+        #other processes can only tell about revocations through a shared
+        #cache. add does not overwrite a concurrent revocation
+        if revoked or revoked_tokens_cache.shared:
+            revoked_tokens_cache.add(jti, revoked)
+    return revoked
+
+def revoke_token(jti):
+    #cached first and failing if the cache is unavailable, as other
+    #processes may have cached that the token is not revoked and would not
+    #check the database again
+    revoked_tokens_cache.set(jti, True, fail_safe=False)
+    RevokedToken(jti=jti).save()
 
 class LogoutAccess(Resource):
     @jwt_required
@@ -334,8 +348,7 @@ class LogoutAccess(Resource):
         """
         jti = get_raw_jwt()['jti']
         try:
-            revoked_token = RevokedToken(jti=jti)
-            revoked_token.save()
+            revoke_token(jti)
             return '', 204
         except:
             raise
@@ -368,8 +381,7 @@ class LogoutRefresh(Resource):
         """
         jti = get_raw_jwt()['jti']
         try:
-            revoked_token = RevokedToken(jti=jti)
-            revoked_token.save()
+            revoke_token(jti)
             return '', 204
         except:
             return mk_errors('error in logout')
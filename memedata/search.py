@@ -0,0 +1,239 @@
+"""
+Full-text search over texts contents.
+
+Contents and queries are reduced to terms (lower-case, stemmed for
+portuguese, without accents) and indexed by a backend:
+'fts5' (sqlite FTS5 virtual table) or 'terms' (inverted index table,
+works on any database). Config SEARCH_BACKEND selects it, by default fts5
+is used on sqlite and terms elsewhere.
+"""
+
+import re
+import unicodedata
+
+from flask import current_app
+from sqlalchemy import (
+    event,
+    inspect,
+    text as sql_text,
+    table as sql_table,
+    column,
+    func,
+    literal,
+)
+
+from memedata.database import db
+from memedata.models import Text
+from memedata.util import chunks
+
+try:
+    import snowballstemmer
+    _stemmer = snowballstemmer.stemmer('portuguese')
+except ImportError:
+    _stemmer = None
+
+TOKEN_RE = re.compile(r'\w+')
+
+#plural endings (of words without accents), mostly left alone by the
+#stemmer on short words
+PLURAL_SUFFIXES = [
+    ('oes', 'ao'),
+    ('aes', 'ao'),
+    ('ns', 'm'),
+    ('ss', 'ss'),
+    ('s', ''),
+]
+
+MAX_TERM_LEN = 64
+
+#maximum number of texts indexed per statement
+CHUNK_SIZE = 500
+
+def fold_accents(string):
+    decomposed = unicodedata.normalize('NFKD', string)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+def stem(token):
+    """
+    Stems token without accents.
+    """
+    if len(token) > 3:
+        for suffix, replacement in PLURAL_SUFFIXES:
+            if token.endswith(suffix):
+                token = token[:-len(suffix)] + replacement
+                break
+    if _stemmer is not None:
+        token = _stemmer.stemWord(token)
+    return token
+
+def get_terms(string):
+    """
+    Gets list of terms of string, in order.
+    Accents are removed first as they are often left out when typing.
+    """
+    tokens = TOKEN_RE.findall(fold_accents(string.lower()))
+    return [stem(t)[:MAX_TERM_LEN] for t in tokens]
+
+def validate_query(q):
+    """
+    Validator for search query arguments.
+    """
+    return bool(get_terms(q))
+
+class Fts5Backend:
+    """
+    Terms in an FTS5 table with rowid = text_id, ranked by bm25.
+    """
+    name = 'fts5'
+    table_name = 'texts_fts'
+
+    def create(self, conn):
+        conn.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(terms, '\
+            'tokenize=\'unicode61\')'.format(self.table_name))
+
+    def drop(self, conn):
+        conn.execute('DROP TABLE IF EXISTS {}'.format(self.table_name))
+
+    def exists(self, conn):
+        return self.table_name in inspect(conn).get_table_names()
+
+    def index(self, conn, texts):
+        texts = list(texts)
+        self.remove(conn, [text_id for text_id, __ in texts])
+        rows = [{'text_id': text_id, 'terms': ' '.join(get_terms(content))} \
+            for text_id, content in texts]
+        if rows:
+            conn.execute(sql_text(
+                'INSERT INTO {} (rowid, terms) VALUES (:text_id, :terms)'\
+                .format(self.table_name)), rows)
+
+    def remove(self, conn, text_ids):
+        for chunk in chunks(list(text_ids), CHUNK_SIZE):
+            conn.execute(sql_text('DELETE FROM {} WHERE rowid IN ({})'.format(
+                self.table_name, ', '.join(str(int(i)) for i in chunk))))
+
+    def remove_selected(self, conn, query):
+        table = sql_table(self.table_name, column('rowid'))
+        conn.execute(table.delete().where(table.c.rowid.in_(query)))
+
+    def search(self, q):
+        terms = sorted(set(get_terms(q)))
+        match = ' '.join('"{}"'.format(t) for t in terms)
+        return sql_text(
+            'SELECT rowid AS text_id, rank FROM {0} WHERE {0} MATCH :match'\
+            .format(self.table_name))\
+            .bindparams(match=match)\
+            .columns(text_id=db.Integer, rank=db.Float)
+
+class TermsBackend:
+    """
+    Inverted index table (term, text_id, number of occurrences), ranked by
+    number of occurrences of query terms.
+    """
+    name = 'terms'
+    table = db.Table('text_terms', db.MetaData(),
+        db.Column('term', db.String(MAX_TERM_LEN), primary_key=True),
+        db.Column('text_id', db.Integer, primary_key=True),
+        db.Column('n', db.Integer, nullable=False),
+        db.Index('ix_text_terms_text_id', 'text_id'),
+    )
+
+    def create(self, conn):
+        self.table.create(conn, checkfirst=True)
+
+    def drop(self, conn):
+        self.table.drop(conn, checkfirst=True)
+
+    def exists(self, conn):
+        return self.table.name in inspect(conn).get_table_names()
+
+    def index(self, conn, texts):
+        texts = list(texts)
+        self.remove(conn, [text_id for text_id, __ in texts])
+        rows = []
+        for text_id, content in texts:
+            counts = {}
+            for term in get_terms(content):
+                counts[term] = counts.get(term, 0) + 1
+            rows.extend({'term': t, 'text_id': text_id, 'n': n} \
+                for t, n in counts.items())
+        if rows:
+            conn.execute(self.table.insert(), rows)
+
+    def remove(self, conn, text_ids):
+        for chunk in chunks(list(text_ids), CHUNK_SIZE):
+            conn.execute(
+                self.table.delete().where(self.table.c.text_id.in_(chunk)))
+
+    def remove_selected(self, conn, query):
+        conn.execute(
+            self.table.delete().where(self.table.c.text_id.in_(query)))
+
+    def search(self, q):
+        terms = sorted(set(get_terms(q)))
+        t = self.table
+        return db.select([t.c.text_id, (-func.sum(t.c.n)).label('rank')])\
+            .where(t.c.term.in_(terms))\
+            .group_by(t.c.text_id)\
+            .having(func.count() == literal(len(terms)))
+
+BACKENDS = {b.name: b for b in [Fts5Backend(), TermsBackend()]}
+
+def get_backend(bind=None):
+    name = current_app.config.get('SEARCH_BACKEND')
+    if name is None:
+        bind = bind if bind is not None else db.engine
+        name = 'fts5' if bind.dialect.name == 'sqlite' else 'terms'
+    return BACKENDS[name]
+
+def search(q):
+    """
+    Gets selectable with columns text_id and rank (lower is better)
+    of texts matching all terms of q.
+    """
+    return get_backend().search(q)
+
+def index_texts(texts):
+    """
+    Indexes (or re-indexes) (text_id, content) pairs.
+    Runs in the current session transaction.
+    """
+    get_backend().index(db.session, texts)
+
+def remove_texts(text_ids):
+    get_backend().remove(db.session, text_ids)
+
+def remove_selected_texts(query):
+    """
+    Removes texts with ids selected by query (a select of one column).
+    """
+    get_backend().remove_selected(db.session, query)
+
+def rebuild_index(conn):
+    """
+    Creates the index if needed and indexes all texts.
+    """
+    backend = get_backend(conn)
+    backend.create(conn)
+    texts = Text.__table__
+    last_id = 0
+    while True:
+        rows = conn.execute(db.select([texts.c.text_id, texts.c.content])\
+            .where(texts.c.text_id > last_id)\
+            .order_by(texts.c.text_id)\
+            .limit(CHUNK_SIZE)).fetchall()
+        if not rows:
+            break
+        backend.index(conn, rows)
+        last_id = rows[-1][0]
+
+@event.listens_for(Text.__table__, 'after_create')
+def create_index(target, conn, **kwargs):
+    get_backend(conn).create(conn)
+
+@event.listens_for(Text.__table__, 'before_drop')
+def drop_index(target, conn, **kwargs):
+    for backend in BACKENDS.values():
+        if backend.name != 'fts5' or conn.dialect.name == 'sqlite':
+            backend.drop(conn)
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from marshmallow_sqlalchemy import (
     ModelSchema,
     field_for,
@@ -9,6 +11,7 @@ from marshmallow import (
     ValidationError,
 )
 from marshmallow.fields import Nested
+from marshmallow.utils import isoformat
 
 from memedata.database import db
 from memedata.models import Text, Tag
@@ -20,6 +23,7 @@ class TagSchema(ModelSchema):
     content = field_for(Tag, 'content', required=True)
     created_at = field_for(Tag, 'created_at', dump_only=True)
     updated_at = field_for(Tag, 'updated_at', dump_only=True)
+    n_texts = field_for(Tag, 'n_texts', dump_only=True)
 
     class Meta:
         unknown = EXCLUDE
@@ -47,11 +51,12 @@ class TextSchema(ModelSchema):
     created_at = field_for(Text, 'created_at', dump_only=True)
     updated_at = field_for(Text, 'updated_at', dump_only=True)
     tags = Nested(TagSchema, many=True,
-        exclude=['created_at', 'updated_at', 'texts'])#, 'tag_id'])
+        exclude=['created_at', 'updated_at', 'n_texts', 'texts'])#, 'tag_id'])
 
     class Meta:
         unknown = EXCLUDE
         model = Text
+        exclude = ('version', )
         sqla_session = db.session
 
     @staticmethod
@@ -60,7 +65,8 @@ class TextSchema(ModelSchema):
 
     @staticmethod
     def pack_tags(dct):
-        dct['tags'] = [t['content'] for t in dct['tags']]
+        if 'tags' in dct:
+            dct['tags'] = [t['content'] for t in dct['tags']]
         return dct
 
     @post_dump(pass_many=True)
@@ -70,3 +76,51 @@ class TextSchema(ModelSchema):
         else:
             dct = TextSchema.pack_tags(dct)
         return {TextSchema.get_envelope_key(many): dct}
+
+def dump_datetime(value):
+    """
+    Same output as marshmallow's DateTime field, with a fast path for
+    naive (UTC) datetimes.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.isoformat() + '+00:00'
+    return isoformat(value)
+
+TEXT_FIELD_GETTERS = {
+    'text_id': lambda t: t.text_id,
+    'content': lambda t: t.content,
+    'created_at': lambda t: dump_datetime(t.created_at),
+    'updated_at': lambda t: dump_datetime(t.updated_at),
+    'tags': lambda t: t.tag_contents,
+}
+
+@lru_cache(maxsize=128)
+def get_text_dumper(fields=None):
+    """
+    Gets function dumping a Text (or TextRecord) to the same dict as
+    TextSchema(only=fields) (without envelope). fields must be a tuple or None.
+    Keys come in the order of the schema's fields, so JSON is byte-identical.
+    """
+    schema = TextSchema(only=fields)
+    getters = [(k, TEXT_FIELD_GETTERS[k]) \
+        for k, f in schema.fields.items() if not f.load_only]
+    def dump(text):
+        return {k: get(text) for k, get in getters}
+    return dump
+
+def dump_text(text, fields=None):
+    """
+    Fast equivalent of TextSchema(only=fields).dump(text).
+    """
+    fields = None if fields is None else tuple(fields)
+    return {TextSchema.get_envelope_key(False): get_text_dumper(fields)(text)}
+
+def dump_texts(texts, fields=None):
+    """
+    Fast equivalent of TextSchema(many=True, only=fields).dump(texts).
+    """
+    fields = None if fields is None else tuple(fields)
+    dump = get_text_dumper(fields)
+    return {TextSchema.get_envelope_key(True): [dump(t) for t in texts]}
@@ -3,9 +3,19 @@
 import argparse
 import getpass
 
+import sqlalchemy as sa
+
 from memedata.app import get_app
 from memedata.database import db
-from memedata.models import User
+from memedata.extensions import caches
+from memedata.models import (
+    User,
+    Text,
+    Tag,
+    Rotation,
+    text_tag_association,
+)
+from memedata import search
 import memedata.config as config
 
 def get_pass(prompt, max_n_trials=3):
@@ -25,7 +35,19 @@ def create_db_tables(app):
     with app.app_context():
         db.create_all()
 
+def clear_caches(app):
+    """
+    Clears caches of the database, so that processes still using it (e.g.
+    workers that were not restarted) do not serve entries of dropped data.
+    """
+    with app.app_context():
+        if 'generations' in sa.inspect(db.engine).get_table_names():
+            for cache in caches:
+                cache.clear()
+        db.session.remove()
+
 def drop_db_tables(app):
+    clear_caches(app)
     with app.app_context():
         db.drop_all()
 
@@ -39,6 +61,88 @@ def reset_db(app):
     drop_db_tables(app)
     create_db_tables(app)
 
+def upgrade_db(app):
+    return upgrade_db_tables(app)
+
+def rebuild_association_table(conn):
+    """
+    Recreates association table with its current definition (primary key
+    included), keeping distinct valid rows of the old one.
+    """
+    old_name = '{}_old'.format(text_tag_association.name)
+    conn.execute('ALTER TABLE {} RENAME TO {}'.format(
+        text_tag_association.name, old_name))
+    text_tag_association.create(conn)
+    old = sa.table(old_name, sa.column('text_id'), sa.column('tag_id'))
+    rows = sa.select([old.c.text_id, old.c.tag_id]).distinct().where(
+        sa.and_(old.c.text_id.isnot(None), old.c.tag_id.isnot(None)))
+    conn.execute(text_tag_association.insert().from_select(
+        ['text_id', 'tag_id'], rows))
+    conn.execute('DROP TABLE {}'.format(old_name))
+
+def recount_tags(conn):
+    """
+    Recomputes number of texts of every tag from association table.
+    """
+    tags = Tag.__table__
+    assoc = text_tag_association
+    n_texts = sa.select([sa.func.count()])\
+        .where(assoc.c.tag_id == tags.c.tag_id).as_scalar()
+    conn.execute(tags.update().values(n_texts=n_texts))
+
+def upgrade_db_tables(app):
+    """
+    Brings tables of an existing database up to the current schema.
+    Returns list of applied changes.
+    """
+    changes = []
+    with app.app_context():
+        with db.engine.begin() as conn:
+            inspector = sa.inspect(conn)
+            table_names = set(inspector.get_table_names())
+            for table in db.metadata.sorted_tables:
+                if not table.name in table_names:
+                    table.create(conn)
+                    changes.append('table {}'.format(table.name))
+            rotations = Rotation.__table__
+            columns = inspector.get_columns(rotations.name)
+            if {c['name'] for c in columns} != set(rotations.c.keys()):
+                #only positions of consumers, which start new cycles
+                rotations.drop(conn)
+                rotations.create(conn)
+                changes.append('{} snapshots'.format(rotations.name))
+            pk = inspector.get_pk_constraint(text_tag_association.name)
+            tags = Tag.__table__
+            columns = {c['name'] for c in inspector.get_columns(tags.name)}
+            if not pk['constrained_columns']:
+                rebuild_association_table(conn)
+                changes.append('{} primary key'.format(
+                    text_tag_association.name))
+            if not 'n_texts' in columns:
+                conn.execute('ALTER TABLE {} ADD COLUMN n_texts INTEGER '\
+                    'NOT NULL DEFAULT 0'.format(tags.name))
+                changes.append('{} n_texts'.format(tags.name))
+            texts = Text.__table__
+            text_columns = inspector.get_columns(texts.name)
+            if not 'version' in {c['name'] for c in text_columns}:
+                conn.execute('ALTER TABLE {} ADD COLUMN version INTEGER '\
+                    'NOT NULL DEFAULT 1'.format(texts.name))
+                changes.append('{} version'.format(texts.name))
+            #duplicates removal also changes counts
+            if not pk['constrained_columns'] or not 'n_texts' in columns:
+                recount_tags(conn)
+            for table in [Text.__table__, Tag.__table__, text_tag_association]:
+                names = {i['name'] for i in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if not index.name in names:
+                        index.create(conn)
+                        changes.append('index {}'.format(index.name))
+            backend = search.get_backend(conn)
+            if not backend.exists(conn):
+                search.rebuild_index(conn)
+                changes.append('search index {}'.format(backend.name))
+    return changes
+
 def create_su(app, passwd=''):
     if not passwd:
         passwd = get_pass('enter superuser password: ')
@@ -71,6 +175,13 @@ def main():
         const=True,
         default=False
     )
+    parser.add_argument(
+        '--upgrade_db',
+        nargs='?',
+        help='upgrade existing database to current schema (keeps data)',
+        const=True,
+        default=False
+    )
     parser.add_argument(
         '--create_su',
         nargs='?',
@@ -103,6 +214,10 @@ def main():
             print('creating tables...', end=' ', flush=True)
             create_db(app)
             print('done.')
+        if args.upgrade_db:
+            print('upgrading database...', end=' ', flush=True)
+            changes = upgrade_db(app)
+            print('done ({}).'.format(', '.join(changes) or 'up to date'))
 
     if args.create_su:
         create_su(app, args.su_passwd)
@@ -0,0 +1,121 @@
+from bisect import bisect_left, insort
+import heapq
+import threading
+import time
+
+from flask import current_app
+
+class TagIndex:
+    """
+    In-memory index of tags for autocompletion: sorted contents for prefix
+    lookups plus usage counts for ranking. Thread-safe.
+    """
+    #shorter prefixes have too many strings at edit distance 1
+    MIN_FUZZY_PREFIX_LEN = 3
+
+    def __init__(self, counts=None):
+        self._lock = threading.Lock()
+        self.load(counts or {})
+
+    def __len__(self):
+        return len(self._contents)
+
+    def load(self, counts):
+        """
+        Replaces index contents with mapping content -> number of texts.
+        """
+        with self._lock:
+            self._counts = dict(counts)
+            self._contents = sorted(self._counts)
+            self._alphabet = set(''.join(self._contents))
+
+    def add(self, contents):
+        """
+        Adds new tags (without texts yet).
+        """
+        with self._lock:
+            for content in contents:
+                if not content in self._counts:
+                    self._counts[content] = 0
+                    insort(self._contents, content)
+                    self._alphabet.update(content)
+
+    def _prefix_range(self, prefix):
+        start = bisect_left(self._contents, prefix)
+        #contents are ascii, so the ones starting with prefix sort before
+        #prefix + '\x7f'
+        end = bisect_left(self._contents, prefix + '\x7f', lo=start)
+        return self._contents[start:end]
+
+    def _edits(self, string):
+        """
+        Strings at edit distance 1 from string (over the tags alphabet).
+        """
+        splits = [(string[:i], string[i:]) for i in range(len(string) + 1)]
+        edits = set()
+        for left, right in splits:
+            if right:
+                edits.add(left + right[1:])
+            if len(right) > 1:
+                edits.add(left + right[1] + right[0] + right[2:])
+            for c in self._alphabet:
+                if right:
+                    edits.add(left + c + right[1:])
+                edits.add(left + c + right)
+        edits.discard(string)
+        return edits
+
+    def suggest(self, prefix, n, fuzzy=False):
+        """
+        Gets up to n (content, number of texts) of tags starting with prefix,
+        most used first. If fuzzy, tags starting with a string at edit
+        distance 1 from prefix (of at least MIN_FUZZY_PREFIX_LEN) come next.
+        """
+        key = lambda c: (self._counts[c], [-ord(x) for x in c])
+        with self._lock:
+            exact = self._prefix_range(prefix)
+            matches = heapq.nlargest(n, exact, key=key)
+            if fuzzy and len(matches) < n \
+                    and len(prefix) >= self.MIN_FUZZY_PREFIX_LEN:
+                exact = set(exact)
+                fuzzy_matches = set()
+                for edit in self._edits(prefix):
+                    fuzzy_matches.update(self._prefix_range(edit))
+                fuzzy_matches -= exact
+                matches.extend(heapq.nlargest(
+                    n - len(matches), fuzzy_matches, key=key))
+            return [(c, self._counts[c]) for c in matches]
+
+class AppTagIndex:
+    """
+    Flask extension keeping one TagIndex per app, loaded by load_fn
+    (returning mapping content -> number of texts) on first use and
+    reloaded after config_key seconds so that changes made by other
+    processes show up.
+    """
+    def __init__(self, name, config_key, load_fn, default_ttl=60):
+        self.name = name
+        self.config_key = config_key
+        self.load_fn = load_fn
+        self.default_ttl = default_ttl
+
+    def init_app(self, app):
+        app.extensions[self.name] = {'index': TagIndex(), 'loaded_at': None}
+
+    @property
+    def index(self):
+        state = current_app.extensions[self.name]
+        ttl = current_app.config.get(self.config_key, self.default_ttl)
+        now = time.monotonic()
+        if state['loaded_at'] is None or now - state['loaded_at'] >= ttl:
+            state['index'].load(self.load_fn())
+            state['loaded_at'] = now
+        return state['index']
+
+    def add(self, contents):
+        """
+        Adds new tags to index, if already loaded.
+        """
+        state = current_app.extensions[self.name]
+        if state['loaded_at'] is not None:
+            state['index'].add(contents)
@@ -1,7 +1,11 @@
+import datetime as dt
+import hashlib
+
 from flask import (
     make_response,
     jsonify,
 )
+from werkzeug.http import http_date, quote_etag
 
 from passlib.hash import pbkdf2_sha256 as sha256
 
@@ -29,6 +33,36 @@ def filter_fields(objs, fields=None, enveloped=True):
 def flatten(lsts):
     return [item for sublst in lsts for item in sublst]
 
+def chunks(lst, size):
+    return [lst[i:i+size] for i in range(0, len(lst), size)]
+
+def _mix(x, key, i):
+    x = (x*0x9e3779b1 + key*0x85ebca77 + i) & 0xffffffff
+    x ^= x >> 15
+    x = (x*0x2c1b3c6d) & 0xffffffff
+    x ^= x >> 12
+    return x
+
+def permute(index, size, key, n_rounds=4):
+    """
+    Maps index in [0, size) to [0, size), bijectively for fixed size and key,
+    so that walking index = 0, 1, ... visits [0, size) in shuffled order.
+    Feistel network over the smallest even number of bits covering size,
+    walking the cycle until the result falls in range.
+    """
+    n_bits = max(2, (size - 1).bit_length())
+    n_bits += n_bits % 2
+    half = n_bits//2
+    mask = (1 << half) - 1
+    x = index
+    while True:
+        left, right = x >> half, x & mask
+        for i in range(n_rounds):
+            left, right = right, left ^ (_mix(right, key, i) & mask)
+        x = (left << half) | right
+        if x < size:
+            return x
+
 def to_list(elem):
     if not isinstance(elem, list):
         elem = [elem]
@@ -66,3 +100,40 @@ def fmt_validation_error_messages(messages):
             [["{}: {}".format(k, v) for v in to_list(vs)]\
                 for k, vs in messages.items()])
     return [str(m) for m in to_list(messages)]
+
+def mk_etag(*parts):
+    """
+    Gets (unquoted) strong entity tag from parts of resource state.
+    """
+    state = '|'.join(str(p) for p in parts)
+    return hashlib.sha1(state.encode('utf-8')).hexdigest()[:32]
+
+def _to_naive_utc(datetime):
+    if datetime.tzinfo is not None:
+        datetime = datetime.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return datetime.replace(microsecond=0)
+
+def validators_headers(etag, last_modified=None):
+    """
+    Gets ETag and Last-Modified headers. Naive datetimes are taken as UTC.
+    """
+    headers = {'ETag': quote_etag(etag)}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(_to_naive_utc(last_modified))
+    return headers
+
+def is_not_modified(req, etag, last_modified=None):
+    """
+    Checks conditional GET request validators against the current ones.
+    If-None-Match takes precedence over If-Modified-Since and, as in
+    RFC 7232, matches weak tags too (given for compressed responses).
+    """
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(etag)
+    if req.if_modified_since is not None and last_modified is not None:
+        return _to_naive_utc(last_modified) \
+            <= _to_naive_utc(req.if_modified_since)
+    return False
+
+def mk_not_modified(headers):
+    return make_response('', 304, headers)
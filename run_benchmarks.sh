@@ -0,0 +1,6 @@
+#!/bin/bash
+
+[[ -z $@ ]] && { echo "usage: $0 <benchmark> (e.g. all_tags)"; exit 1; }
+for bench in $@; do
+    python3 -m benchmarks.$bench
+done
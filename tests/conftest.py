@@ -1,4 +1,6 @@
 import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
 from memedata.app import get_app
 from memedata.resources import images
 from memedata import config
@@ -23,6 +25,34 @@ def app():
         db.session.remove()
         db.drop_all()
 
+@pytest.fixture()
+def sql_statements(app):
+    """
+    List of SQL statements sent to the database, appended as executed.
+    """
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+@pytest.fixture()
+def max_sql_statements(sql_statements):
+    """
+    Context manager asserting that at most n SQL statements run inside it.
+    """
+    @contextmanager
+    def assert_max_sql_statements(n):
+        del sql_statements[:]
+        yield
+        assert len(sql_statements) <= n, \
+            'expected at most {} statements, got:\n{}'.format(
+                n, '\n'.join(sql_statements))
+    return assert_max_sql_statements
+
 @pytest.fixture()
 def image_getter():
     def image_getter_color(color):
@@ -58,6 +88,8 @@ def client_with_tok(app):
             c.post = decorate_crud(c.post, token)
             c.delete = decorate_crud(c.delete, token)
             c.put = decorate_crud(c.put, token)
+            c.patch = decorate_crud(c.patch, token)
+            c.head = decorate_crud(c.head, token)
         yield c
     #fake images db
     images.DB.clear()
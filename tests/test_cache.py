@@ -0,0 +1,338 @@
+import datetime as dt
+import sqlite3
+from array import array
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from memedata.app import get_app
+from memedata import config
+from memedata.database import db
+from memedata.cache import LRUCache, SqliteCache, RedisCache
+from memedata.extensions import text_ids_sizeof
+from memedata.setup_db import create_db, reset_db
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+    stats = cache.stats()
+    assert (stats['n_items'], stats['hits'], stats['misses']) == (2, 3, 1)
+    assert stats['hit_rate'] == 0.75
+
+def test_lru_cache_sized_by_sizeof():
+    cache = LRUCache(10, sizeof=len)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    assert cache.stats()['size'] == 8
+    cache.set('a', b'12')
+    assert cache.stats()['size'] == 6
+    cache.set('c', b'123456')
+    assert cache.get('b') is None
+    assert cache.stats()['size'] == 8
+    #values larger than max_size are not kept
+    cache.set('d', b'12345678901')
+    assert len(cache) == 0
+    assert cache.stats()['size'] == 0
+    cache.set('e', b'1')
+    cache.clear()
+    assert cache.stats()['size'] == 0
+
+def test_text_ids_cache_sized_in_bytes():
+    cache = LRUCache(10000, sizeof=text_ids_sizeof)
+    cache.set('filters', (1, 0.0, array('q', range(1000))))
+    assert 8000 < cache.stats()['size'] < 10000
+    cache.set(('snapshot', 'digest'), array('q', range(1000)))
+    assert cache.get('filters') is None
+    #empty arrays count too, so their number is bounded as well
+    assert text_ids_sizeof((1, 0.0, array('q'))) > 0
+
+class RedisStandIn:
+    """
+    In-process stand-in for the subset of the redis client API used.
+    """
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        self.ttls[key] = ex
+        return True
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def pipeline(self):
+        return RedisStandInPipeline(self)
+
+class RedisStandInPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def set(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+
+    def execute(self):
+        return [self.client.set(*a, **kw) for a, kw in self.calls]
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def mk_shared_cache(request, tmp_path):
+    """
+    Makes caches of the same namespace, as seen by different processes.
+    """
+    client = RedisStandIn()
+    def mk(max_size=100, sizeof=None):
+        if request.param == 'sqlite':
+            return SqliteCache(
+                str(tmp_path/'cache.db'), 'test', max_size, sizeof)
+        return RedisCache(client, 'test', max_size, sizeof)
+    return mk
+
+def test_shared_cache_is_shared(mk_shared_cache):
+    cache1 = mk_shared_cache()
+    cache2 = mk_shared_cache()
+    key = (3, 'json',
+        (('any_tags', ('a', 'b')), ('date_from', dt.date(2018, 9, 15))))
+    cache1.set(key, b'body')
+    cache1.set_many({'a': 1, 'b': [2]})
+    assert cache2.get(key) == b'body'
+    assert cache2.get_many(['a', 'b', 'c']) == {'a': 1, 'b': [2]}
+    assert cache2.get('c', 0) == 0
+
+    cache2.add('a', 10)
+    cache2.add('c', 3)
+    assert cache1.get_many(['a', 'c']) == {'a': 1, 'c': 3}
+
+    #invalidation by one process is seen by the others
+    cache2.clear()
+    assert cache1.get_many(['a', 'b', 'c', key]) == {}
+    cache1.set('a', 4)
+    assert cache2.get('a') == 4
+
+    stats = cache1.stats()
+    assert (stats['hits'], stats['misses']) == (2, 4)
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    cache = SqliteCache(str(tmp_path/'cache.db'), 'test', 10, sizeof=len)
+    other = SqliteCache(str(tmp_path/'cache.db'), 'other', 10, sizeof=len)
+    other.set('a', b'1234567890')
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    cache.set('a', b'12')
+    cache.set('c', b'123456')
+    assert cache.get_many(['a', 'b', 'c']) == {'a': b'12', 'c': b'123456'}
+    assert cache.stats()['size'] == 8
+    assert len(cache) == 2
+    #namespaces are sized independently
+    assert other.get('a') == b'1234567890'
+
+def test_redis_cache_sets_ttl_and_bounds_values():
+    client = RedisStandIn()
+    cache = RedisCache(client, 'test', max_size=4, sizeof=len, ttl=60)
+    cache.set('a', b'1234')
+    cache.set_many({'b': b'12345', 'c': b'1'})
+    cache.add('d', b'12')
+    cache.add('e', b'12345')
+    assert cache.get_many(['a', 'b', 'c', 'd', 'e']) == \
+        {'a': b'1234', 'c': b'1', 'd': b'12'}
+    #all but the namespace version
+    assert sorted(client.ttls.values()) == [60, 60, 60]
+
+class BrokenRedis:
+    def __getattr__(self, attr):
+        def fail(*args, **kwargs):
+            raise ConnectionError('connection refused')
+        return fail
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def broken_cache(request, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        #a directory can not be opened as database
+        return SqliteCache(str(tmp_path), 'test', 10)
+    monkeypatch.setattr(RedisCache, 'ERRORS', (ConnectionError, ))
+    return RedisCache(BrokenRedis(), 'test', 10)
+
+def test_shared_cache_errors_are_misses(broken_cache):
+    broken_cache.set('a', 1)
+    broken_cache.set_many({'b': 2})
+    broken_cache.add('c', 3)
+    broken_cache.clear()
+    assert broken_cache.get('a', 0) == 0
+    assert broken_cache.get_many(['a', 'b']) == {}
+    assert broken_cache.stats()['hits'] == 0
+
+def test_app_works_with_unavailable_cache(tmp_path):
+    class BrokenCacheConfig(config.get_app_test_config_class()):
+        CACHE_BACKEND = 'sqlite'
+        CACHE_SQLITE_PATH = str(tmp_path)
+    broken_app = get_app(BrokenCacheConfig)
+    with broken_app.app_context():
+        db.create_all()
+        token = create_access_token(identity='testuser')
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    client = broken_app.test_client()
+    resp = client.post('/texts', data={'content': 'aa', 'tags': 'a'},
+        headers=headers)
+    assert resp.status_code == 201
+    resp = client.get('/texts?any_tags=a', headers=headers)
+    assert [t['content'] for t in resp.json['texts']] == ['aa']
+    assert client.get('/texts/random', headers=headers).status_code == 200
+    assert client.get('/texts/count', headers=headers).json['n_texts'] == 1
+
+class FlakyRedis(RedisStandIn):
+    """
+    Stand-in whose plain sets (not adds) fail while broken.
+    """
+    broken = False
+
+    def set(self, key, value, nx=False, ex=None):
+        if self.broken and not nx:
+            raise ConnectionError('connection reset')
+        return super().set(key, value, nx=nx, ex=ex)
+
+def test_revocation_not_lost_if_cache_fails(monkeypatch):
+    monkeypatch.setattr(RedisCache, 'ERRORS', (ConnectionError, ))
+    redis_client = FlakyRedis()
+    class FlakyCacheConfig(config.get_app_test_config_class()):
+        CACHE_BACKEND = 'redis'
+        CACHE_REDIS_CLIENT = redis_client
+    app = get_app(FlakyCacheConfig)
+    with app.app_context():
+        db.create_all()
+        token = create_access_token(identity='testuser')
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    client = app.test_client()
+    #caches that the token is not revoked
+    assert client.get('/auth/ok', headers=headers).status_code == 200
+
+    redis_client.broken = True
+    assert client.post(
+        '/auth/logout/access', headers=headers).status_code == 500
+    redis_client.broken = False
+    #logout failed as a whole, so it can be retried
+    assert client.get('/auth/ok', headers=headers).status_code == 200
+    assert client.post(
+        '/auth/logout/access', headers=headers).status_code == 204
+    assert client.get('/auth/ok', headers=headers).status_code == 401
+
+def test_revocation_errors_are_raised(broken_cache):
+    with pytest.raises(ConnectionError if isinstance(
+            broken_cache, RedisCache) else sqlite3.Error):
+        broken_cache.set('a', True, fail_safe=False)
+
+@pytest.fixture()
+def workers(tmp_path):
+    """
+    Two apps sharing database and sqlite cache, as two WSGI workers would.
+    """
+    class WorkerConfig(config.get_app_test_config_class()):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///{}'.format(tmp_path/'data.db')
+        CACHE_BACKEND = 'sqlite'
+        CACHE_SQLITE_PATH = str(tmp_path/'cache.db')
+    apps = [get_app(WorkerConfig), get_app(WorkerConfig)]
+    with apps[0].app_context():
+        db.create_all()
+        token = create_access_token(identity='testuser')
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    yield [app.test_client() for app in apps], headers
+    with apps[0].app_context():
+        db.session.remove()
+        db.drop_all()
+
+def test_workers_observe_token_revocations(workers):
+    (client1, client2), headers = workers
+    assert client2.get('/auth/ok', headers=headers).status_code == 200
+    assert client1.post(
+        '/auth/logout/access', headers=headers).status_code == 204
+    assert client2.get('/auth/ok', headers=headers).status_code == 401
+
+def test_workers_observe_text_writes(workers):
+    (client1, client2), headers = workers
+    client1.post('/texts', data={'content': 'aa', 'tags': 'a'},
+        headers=headers)
+    resp = client2.get('/texts/random?any_tags=a', headers=headers)
+    assert len(resp.json['texts']) == 1
+    client1.post('/texts', data={'content': 'bb', 'tags': 'a'},
+        headers=headers)
+    resp = client2.get('/texts/random?any_tags=a&n=10', headers=headers)
+    assert len(resp.json['texts']) == 2
+    resp = client2.get('/texts?any_tags=a', headers=headers)
+    assert len(resp.json['texts']) == 2
+    client1.delete('/texts/1', headers=headers)
+    resp = client2.get('/texts?any_tags=a', headers=headers)
+    assert len(resp.json['texts']) == 1
+
+def mk_worker_config(tmp_path, db_name):
+    class WorkerConfig(config.get_app_test_config_class()):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///{}'.format(tmp_path/db_name)
+        CACHE_BACKEND = 'sqlite'
+        CACHE_SQLITE_PATH = str(tmp_path/'cache.db')
+    return WorkerConfig
+
+def test_databases_sharing_cache_do_not_mix(tmp_path):
+    apps = [get_app(mk_worker_config(tmp_path, name)) \
+        for name in ['a.db', 'b.db']]
+    for app in apps:
+        with app.app_context():
+            db.create_all()
+            token = create_access_token(identity='testuser')
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    client_a, client_b = [app.test_client() for app in apps]
+    client_a.post('/texts', data={'content': 'aa', 'tags': 'x'},
+        headers=headers)
+    client_b.post('/texts', data={'content': 'bb', 'tags': 'y'},
+        headers=headers)
+    assert client_a.get('/texts', headers=headers).json['texts'][0]\
+        ['content'] == 'aa'
+    assert client_b.get('/texts', headers=headers).json['texts'][0]\
+        ['content'] == 'bb'
+
+    resp = client_b.post('/texts', data={'content': 'cc', 'tags': 'x'},
+        headers=headers)
+    assert resp.json['text']['tags'] == ['x']
+    tags = client_b.get('/tags', headers=headers).json['tags']
+    assert tags == [{'content': 'x', 'n_texts': 1},
+        {'content': 'y', 'n_texts': 1}]
+
+def test_recreated_database_does_not_see_old_entries(tmp_path):
+    worker_config = mk_worker_config(tmp_path, 'data.db')
+    app = get_app(worker_config)
+    create_db(app)
+    with app.app_context():
+        token = create_access_token(identity='testuser')
+    headers = {'Authorization': 'Bearer {}'.format(token)}
+    running = app.test_client()
+
+    def check(client):
+        client.post('/texts', data={'content': 'aa', 'tags': 'x'},
+            headers=headers)
+        resp = client.get('/texts', headers=headers)
+        assert [t['content'] for t in resp.json['texts']] == ['aa']
+        reset_db(get_app(worker_config))
+        #same generation and tag ids as before the reset
+        client.post('/texts', data={'content': 'bb', 'tags': 'y'},
+            headers=headers)
+        resp = client.get('/texts', headers=headers)
+        assert [t['content'] for t in resp.json['texts']] == ['bb']
+        resp = client.post('/texts', data={'content': 'cc', 'tags': 'x'},
+            headers=headers)
+        assert resp.json['text']['tags'] == ['x']
+        reset_db(get_app(worker_config))
+
+    check(running)
+    #restarted worker
+    check(get_app(worker_config).test_client())
@@ -0,0 +1,72 @@
+import gzip
+import json
+
+import pytest
+
+from memedata import compression
+from memedata.extensions import texts_query_cache
+
+def post_texts(client, n):
+    client.post('/texts/batch', json=[
+        {'content': 'bom dia {}'.format(i), 'tags': ['bomdia']} \
+            for i in range(n)])
+
+def test_texts_get_gzip(client_with_tok):
+    post_texts(client_with_tok, 100)
+    identity = client_with_tok.get('/texts')
+    assert not 'Content-Encoding' in identity.headers
+    resp = client_with_tok.get('/texts',
+        headers={'Accept-Encoding': 'gzip, deflate'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    assert len(resp.data) < len(identity.data)
+    assert gzip.decompress(resp.data) == identity.data
+    #same representation, other bytes
+    assert resp.headers['ETag'] == 'W/' + identity.headers['ETag']
+    resp = client_with_tok.get('/texts', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': resp.headers['ETag']})
+    assert resp.status_code == 304
+
+def test_texts_get_brotli(client_with_tok):
+    brotli = pytest.importorskip('brotli')
+    post_texts(client_with_tok, 100)
+    identity = client_with_tok.get('/texts')
+    resp = client_with_tok.get('/texts',
+        headers={'Accept-Encoding': 'gzip, br'})
+    assert resp.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(resp.data) == identity.data
+    resp = client_with_tok.get('/texts',
+        headers={'Accept-Encoding': 'gzip, br;q=0'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+
+def test_texts_get_cached_compressed(app, client_with_tok, monkeypatch):
+    post_texts(client_with_tok, 100)
+    n_calls = []
+    compress = gzip.compress
+    monkeypatch.setattr(compression.gzip, 'compress',
+        lambda *args: n_calls.append(1) or compress(*args))
+    headers = {'Accept-Encoding': 'gzip'}
+    first = client_with_tok.get('/texts', headers=headers)
+    second = client_with_tok.get('/texts', headers=headers)
+    assert second.data == first.data
+    assert len(n_calls) == 1
+    with app.app_context():
+        assert texts_query_cache.stats()['size'] == len(first.data)
+
+def test_small_responses_not_compressed(app, client_with_tok):
+    post_texts(client_with_tok, 1)
+    headers = {'Accept-Encoding': 'gzip'}
+    resp = client_with_tok.get('/texts', headers=headers)
+    assert not 'Content-Encoding' in resp.headers
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    app.config['COMPRESS_MIN_SIZE'] = 0
+    resp = client_with_tok.get('/texts/1', headers=headers)
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(resp.data))['text']['text_id'] == 1
+
+def test_other_responses_compressed(client_with_tok):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 'aa', 'tags': ['tag{}'.format(i)]} for i in range(100)])
+    resp = client_with_tok.get('/tags', headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert len(json.loads(gzip.decompress(resp.data))['tags']) == 100
@@ -0,0 +1,45 @@
+import json
+
+from memedata.import_db import import_texts
+
+def write_lines(path, lines):
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    return str(path)
+
+def test_import_db_plain_texts(app, client_with_tok, tmp_path):
+    path = write_lines(tmp_path / 'sentences.txt',
+        ['Bom dia!', '', 'Eu adoro as manhãs'])
+    n_texts, errors = import_texts(app, [path])
+
+    assert n_texts == 2
+    assert errors == []
+    elems = client_with_tok.get('/texts').json['texts']
+    assert {e['content'] for e in elems} == {'Bom dia!', 'Eu adoro as manhãs'}
+    elems = client_with_tok.get('/texts?q=manha').json['texts']
+    assert [e['content'] for e in elems] == ['Eu adoro as manhãs']
+
+def test_import_db_ndjson_texts_and_tags(app, client_with_tok, tmp_path):
+    client_with_tok.post('/texts', data={'content': 'old', 'tags': 'a'})
+    texts_path = write_lines(tmp_path / 'texts.ndjson', [
+        json.dumps({'content': 'aa', 'tags': ['a', 'b']}),
+        json.dumps({'content': 'bb', 'tags': 'b,c'}),
+        json.dumps({'content': 'cc', 'tags': ['NOPE']}),
+        '{"content": ',
+        json.dumps({'content': 'dd'}),
+    ])
+    tags_path = write_lines(tmp_path / 'tags.csv', ['x', 'y,z', 'not ok'])
+    n_texts, errors = import_texts(
+        app, [texts_path], [tags_path], chunk_size=2)
+
+    assert n_texts == 3
+    assert sorted((p, n) for p, n, __ in errors) == \
+        [(tags_path, 3), (texts_path, 3), (texts_path, 4)]
+    elems = client_with_tok.get('/texts').json['texts']
+    tags = {e['content']: sorted(e['tags']) for e in elems}
+    assert tags == {'old': ['a'], 'aa': ['a', 'b'], 'bb': ['b', 'c'], 'dd': []}
+    counts = {t['content']: t['n_texts'] for t in \
+        client_with_tok.get('/tags').json['tags']}
+    assert counts == {'a': 2, 'b': 2, 'c': 1, 'x': 0, 'y': 0, 'z': 0}
+    assert len({e['text_id'] for e in elems}) == 4
+    resp = client_with_tok.post('/texts', data={'content': 'new', 'tags': 'z'})
+    assert resp.status_code == 201
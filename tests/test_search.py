@@ -0,0 +1,93 @@
+import pytest
+
+from memedata.database import db
+from memedata import search
+from memedata.setup_db import upgrade_db
+
+@pytest.fixture(params=['fts5', 'terms'])
+def search_client(request, app, client_with_tok):
+    app.config['SEARCH_BACKEND'] = request.param
+    with app.app_context():
+        with db.engine.begin() as conn:
+            search.get_backend(conn).create(conn)
+    return client_with_tok
+
+def get_contents(client, query):
+    resp = client.get('/texts', query_string=query)
+    assert resp.status_code == 200
+    return [t['content'] for t in resp.json['texts']]
+
+def test_get_terms_folds_accents_and_stems():
+    assert search.get_terms('Bom DIA, manhãs abençoadas!') == \
+        search.get_terms('bom dia manha abençoada')
+    assert search.get_terms('corações bons dias') == \
+        search.get_terms('coração bom dia')
+    assert search.get_terms('...') == []
+
+def test_search_matches_all_words(search_client):
+    search_client.post('/texts', data={'content': 'Bom dia, família!'})
+    search_client.post('/texts', data={'content': 'Boa noite família'})
+    search_client.post('/texts', data={'content': 'Bons dias a todos'})
+    assert get_contents(search_client, {'q': 'familia'}) == \
+        ['Bom dia, família!', 'Boa noite família']
+    assert sorted(get_contents(search_client, {'q': 'DIAS bom'})) == \
+        ['Bom dia, família!', 'Bons dias a todos']
+    assert get_contents(search_client, {'q': 'bom familia'}) == \
+        ['Bom dia, família!']
+    assert get_contents(search_client, {'q': 'tarde'}) == []
+
+def test_search_is_ranked(search_client):
+    search_client.post('/texts', data={'content': 'flores e mais coisas'})
+    search_client.post('/texts', data={'content': 'flores flores flores'})
+    search_client.post('/texts', data={'content': 'nada a ver'})
+    assert get_contents(search_client, {'q': 'flor'}) == \
+        ['flores flores flores', 'flores e mais coisas']
+
+def test_search_with_filters_and_pagination(search_client):
+    search_client.post('/texts/batch', json=[
+        {'content': 'bom dia {}'.format(i), 'tags': ['a'] if i%2 else []} \
+            for i in range(10)])
+    resp = search_client.get('/texts',
+        query_string={'q': 'dia', 'any_tags': 'a', 'max_n_results': 3})
+    assert len(resp.json['texts']) == 3
+    assert resp.json['offset'] == 3
+    assert resp.json['next_cursor'] is None
+    resp = search_client.get('/texts',
+        query_string={'q': 'dia', 'any_tags': 'a', 'offset': 3})
+    assert len(resp.json['texts']) == 2
+
+def test_search_index_follows_changes(search_client):
+    search_client.post('/texts', data={'content': 'bom dia'})
+    search_client.post('/texts/batch', json=[{'content': 'dia feliz'}])
+    search_client.put('/texts/1', data={'content': 'boa tarde'})
+    assert get_contents(search_client, {'q': 'dia'}) == ['dia feliz']
+    assert get_contents(search_client, {'q': 'tarde'}) == ['boa tarde']
+    search_client.delete('/texts/1')
+    assert get_contents(search_client, {'q': 'tarde'}) == []
+    search_client.delete('/texts', query_string={'q': 'feliz'})
+    assert get_contents(search_client, {'q': 'dia'}) == []
+
+def test_search_in_export_and_random(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'bom dia'})
+    client_with_tok.post('/texts', data={'content': 'boa noite'})
+    resp = client_with_tok.get('/texts/export?q=noite&fields=content')
+    assert resp.get_data(as_text=True) == '{"content": "boa noite"}\n'
+    resp = client_with_tok.get('/texts/random?q=dia&n=10&fields=content')
+    assert resp.json['texts'] == [{'content': 'bom dia'}]
+
+def test_search_invalid_args(client_with_tok):
+    resp = client_with_tok.get('/texts?q=!!!')
+    assert resp.status_code == 400
+    resp = client_with_tok.get('/texts',
+        query_string={'q': 'dia', 'cursor': 'MjAxOC0wMS0wMSAwMDowMDowMHwx'})
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+
+def test_upgrade_db_builds_search_index(app, client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'bom dia'})
+    with app.app_context():
+        db.session.execute('DROP TABLE texts_fts')
+        db.session.commit()
+
+    assert upgrade_db(app) == ['search index fts5']
+    assert get_contents(client_with_tok, {'q': 'dia'}) == ['bom dia']
@@ -0,0 +1,46 @@
+import datetime as dt
+import json
+
+import pytest
+import pytz
+
+from memedata.database import db
+from memedata.models import Text
+from memedata.serializers import TextSchema, dump_text, dump_texts
+from memedata import representations
+
+@pytest.mark.parametrize('fields', [
+    None,
+    [],
+    ['content'],
+    ['tags', 'text_id'],
+    ['text_id', 'tags'],
+    ['updated_at', 'content', 'created_at', 'tags', 'text_id'],
+])
+def test_dump_texts_same_json_as_schema(app, client_with_tok, fields):
+    client_with_tok.post('/texts', data={'content': 'áé"\n', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb'})
+    client_with_tok.put('/texts/2', data={'content': 'cc'})
+    with app.app_context():
+        texts = Text.query.order_by(Text.text_id).all()
+        #aware datetimes go through marshmallow's conversion
+        texts[0].updated_at = pytz.timezone('Brazil/East').localize(
+            dt.datetime(2018, 1, 2, 3, 4, 5, 6))
+        expected = TextSchema(many=True, only=fields).dump(texts)
+        assert json.dumps(dump_texts(texts, fields)) == json.dumps(expected)
+        expected = TextSchema(only=fields).dump(texts[1])
+        assert json.dumps(dump_text(texts[1], fields)) == json.dumps(expected)
+        db.session.rollback()
+
+def test_fast_json_representation(app, client_with_tok, monkeypatch):
+    client_with_tok.post('/texts', data={'content': 'á', 'tags': 'a'})
+    default = client_with_tok.get('/texts')
+    app.config['FAST_JSON'] = True
+    fast = client_with_tok.get('/texts')
+    assert fast.headers['Content-Type'] == 'application/json'
+    assert fast.json == default.json
+    if representations.orjson is not None:
+        assert fast.data != default.data
+
+    monkeypatch.setattr(representations, 'orjson', None)
+    assert client_with_tok.get('/texts').data == default.data
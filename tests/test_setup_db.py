@@ -0,0 +1,98 @@
+import sqlalchemy as sa
+
+from memedata.database import db
+from memedata.setup_db import upgrade_db
+
+def mk_legacy_association_table(app):
+    with app.app_context():
+        db.session.execute('DROP INDEX ix_association_tag_id_text_id')
+        db.session.execute('DROP INDEX ix_texts_created_at_text_id')
+        db.session.execute('DROP TABLE association')
+        db.session.execute(
+            'CREATE TABLE association (text_id INTEGER, tag_id INTEGER)')
+        db.session.commit()
+
+def test_upgrade_db_adds_primary_key_and_indexes(app, client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    mk_legacy_association_table(app)
+    with app.app_context():
+        db.session.execute(
+            'INSERT INTO association VALUES (1, 1), (1, 1), (1, 2)')
+        db.session.commit()
+
+    changes = upgrade_db(app)
+    assert 'association primary key' in changes
+
+    with app.app_context():
+        inspector = sa.inspect(db.engine)
+        pk = inspector.get_pk_constraint('association')
+        assert set(pk['constrained_columns']) == {'text_id', 'tag_id'}
+        indexes = {i['name'] for i in inspector.get_indexes('association')}
+        assert 'ix_association_tag_id_text_id' in indexes
+        indexes = {i['name'] for i in inspector.get_indexes('texts')}
+        assert 'ix_texts_created_at_text_id' in indexes
+        rows = db.session.execute('SELECT * FROM association').fetchall()
+        assert sorted(rows) == [(1, 1), (1, 2)]
+
+    elems = client_with_tok.get('/texts?all_tags=a,b').json['texts']
+    assert len(elems) == 1
+
+def test_upgrade_db_adds_texts_version(app, client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa'})
+    etag = client_with_tok.get('/texts/1').headers['ETag']
+    with app.app_context():
+        db.session.execute('CREATE TABLE texts_new (text_id INTEGER '
+            'PRIMARY KEY, content VARCHAR(2049) NOT NULL, created_at '
+            'DATETIME, updated_at DATETIME)')
+        db.session.execute('INSERT INTO texts_new SELECT text_id, content, '
+            'created_at, updated_at FROM texts')
+        db.session.execute('DROP TABLE texts')
+        db.session.execute('ALTER TABLE texts_new RENAME TO texts')
+        db.session.commit()
+
+    assert 'texts version' in upgrade_db(app)
+    resp = client_with_tok.get('/texts/1', headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    client_with_tok.put('/texts/1', data={'content': 'bb'})
+    resp = client_with_tok.get('/texts/1', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+
+def test_upgrade_db_is_idempotent(app):
+    assert upgrade_db(app) == []
+    assert upgrade_db(app) == []
+
+def test_upgrade_db_creates_missing_tables(app, client_with_tok):
+    with app.app_context():
+        db.session.execute('DROP TABLE rotations')
+        db.session.commit()
+
+    assert upgrade_db(app) == ['table rotations']
+    resp = client_with_tok.get('/texts/next?consumer=bot')
+    assert resp.status_code == 200
+
+def test_upgrade_db_creates_generations(app, client_with_tok):
+    with app.app_context():
+        db.session.execute('DROP TABLE generations')
+        db.session.commit()
+
+    assert upgrade_db(app) == ['table generations']
+    etag = client_with_tok.get('/texts').headers['ETag']
+    client_with_tok.post('/texts', data={'content': 'aa'})
+    assert client_with_tok.get('/texts').headers['ETag'] != etag
+
+def test_upgrade_db_recreates_legacy_rotations(app, client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa'})
+    with app.app_context():
+        db.session.execute('DROP TABLE rotations')
+        db.session.execute('DROP TABLE snapshots')
+        db.session.execute('CREATE TABLE rotations (consumer VARCHAR(128), '
+            'filters VARCHAR(40), cycle INTEGER, seed INTEGER, '
+            'first_id INTEGER, n_ids INTEGER, position INTEGER, '
+            'updated_at DATETIME, PRIMARY KEY (consumer, filters))')
+        db.session.execute("INSERT INTO rotations VALUES "
+            "('bot', 'x', 0, 1, 1, 1, 0, NULL)")
+        db.session.commit()
+
+    assert upgrade_db(app) == ['table snapshots', 'rotations snapshots']
+    resp = client_with_tok.get('/texts/next?consumer=bot')
+    assert [t['content'] for t in resp.json['texts']] == ['aa']
@@ -0,0 +1,164 @@
+from memedata.database import db
+from memedata.tag_index import TagIndex
+from memedata.setup_db import upgrade_db
+
+def get_counts(client):
+    resp = client.get('/tags')
+    assert resp.status_code == 200
+    return {t['content']: t['n_texts'] for t in resp.json['tags']}
+
+def test_tags_counts_follow_text_writes(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    assert get_counts(client_with_tok) == {'a': 1, 'b': 2}
+
+    client_with_tok.put('/texts/1', data={'tags': 'c'})
+    assert get_counts(client_with_tok) == {'a': 0, 'b': 1, 'c': 1}
+
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 'cc', 'tags': ['a', 'c']}, {'content': 'dd', 'tags': 'a'}])
+    assert get_counts(client_with_tok) == {'a': 2, 'b': 1, 'c': 2}
+
+    client_with_tok.patch('/texts',
+        data={'any_tags': 'a', 'add_tags': 'b,d', 'remove_tags': 'c'})
+    assert get_counts(client_with_tok) == {'a': 2, 'b': 3, 'c': 1, 'd': 2}
+
+    client_with_tok.delete('/texts/3')
+    assert get_counts(client_with_tok) == {'a': 1, 'b': 2, 'c': 1, 'd': 1}
+
+    client_with_tok.delete('/texts', query_string={'any_tags': 'b'})
+    assert get_counts(client_with_tok) == {'a': 0, 'b': 0, 'c': 1, 'd': 0}
+
+def test_tags_sorting_and_pagination(client_with_tok):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 'aa', 'tags': ['x', 'y', 'z']},
+        {'content': 'bb', 'tags': ['y', 'z']},
+        {'content': 'cc', 'tags': ['y', 'w']}])
+
+    def get_tags(query):
+        resp = client_with_tok.get('/tags', query_string=query)
+        return [t['content'] for t in resp.json['tags']], resp.json['offset']
+
+    assert get_tags({}) == (['w', 'x', 'y', 'z'], None)
+    assert get_tags({'sort': '-content'}) == (['z', 'y', 'x', 'w'], None)
+    assert get_tags({'sort': '-n_texts'}) == (['y', 'z', 'w', 'x'], None)
+    assert get_tags({'sort': 'n_texts'}) == (['w', 'x', 'z', 'y'], None)
+    assert get_tags({'sort': '-n_texts', 'max_n_results': 2}) == \
+        (['y', 'z'], 2)
+    assert get_tags({'sort': '-n_texts', 'offset': 2}) == (['w', 'x'], None)
+
+def test_tags_get_bounded_number_of_statements(
+        client_with_tok, max_sql_statements):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 't{}'.format(i), 'tags': ['a{}'.format(i%50)]} \
+            for i in range(200)])
+    #token check, tags
+    with max_sql_statements(2):
+        resp = client_with_tok.get('/tags')
+    assert len(resp.json['tags']) == 50
+    assert all(t['n_texts'] == 4 for t in resp.json['tags'])
+
+def test_tags_invalid_args(client_with_tok):
+    resp = client_with_tok.get('/tags?sort=nope')
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+
+def test_tag_get(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    resp = client_with_tok.get('/tags/b')
+    assert resp.status_code == 200
+    assert resp.json == {'tag': {'content': 'b', 'n_texts': 2}}
+    resp = client_with_tok.get('/tags/nope')
+    assert resp.status_code == 404
+    assert set(resp.json.keys()) == {'errors'}
+
+def test_tags_cannot_get_logged_of(client):
+    assert client.get('/tags').status_code == 401
+    assert client.get('/tags/a').status_code == 401
+
+def test_upgrade_db_adds_tags_counts(app, client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    with app.app_context():
+        db.session.execute('DROP INDEX ix_tags_n_texts')
+        db.session.execute('ALTER TABLE tags DROP COLUMN n_texts')
+        db.session.commit()
+
+    assert upgrade_db(app) == ['tags n_texts', 'index ix_tags_n_texts']
+    assert get_counts(client_with_tok) == {'a': 1, 'b': 2}
+
+def test_tag_index_suggest():
+    index = TagIndex({'bomdia': 10, 'bomdiaa': 2, 'bondia': 5, 'boa': 7,
+        'boanoite': 1, 'cafe': 3})
+    assert index.suggest('bo', 10) == [
+        ('bomdia', 10), ('boa', 7), ('bondia', 5), ('bomdiaa', 2),
+        ('boanoite', 1)]
+    assert index.suggest('bomd', 1) == [('bomdia', 10)]
+    assert index.suggest('x', 10) == []
+    #exact matches first
+    assert index.suggest('bomd', 10, fuzzy=True) == [
+        ('bomdia', 10), ('bomdiaa', 2), ('bondia', 5)]
+    #transposition, deletion, insertion
+    assert index.suggest('cfae', 10, fuzzy=True) == [('cafe', 3)]
+    assert index.suggest('bmdia', 10, fuzzy=True)[0] == ('bomdia', 10)
+    assert index.suggest('caffe', 10, fuzzy=True) == [('cafe', 3)]
+    #too short for fuzzy matching
+    assert index.suggest('cs', 10, fuzzy=True) == []
+
+    index.add(['bolo', 'boa'])
+    assert index.suggest('bo', 10)[-1] == ('bolo', 0)
+    assert len(index) == 7
+
+def test_tags_suggest(app, client_with_tok):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 'aa', 'tags': ['bomdia', 'boa']},
+        {'content': 'bb', 'tags': ['bomdia', 'bondia']},
+        {'content': 'cc', 'tags': ['bomdia', 'cafe']}])
+
+    def suggest(query):
+        resp = client_with_tok.get('/tags-suggest', query_string=query)
+        assert resp.status_code == 200
+        return [(t['content'], t['n_texts']) for t in resp.json['tags']]
+
+    assert suggest({'prefix': 'bo'}) == \
+        [('bomdia', 3), ('boa', 1), ('bondia', 1)]
+    assert suggest({'prefix': 'BO', 'max_n_results': 1}) == [('bomdia', 3)]
+    assert suggest({'prefix': 'bomd'}) == [('bomdia', 3)]
+    assert suggest({'prefix': 'bomd', 'fuzzy': 'true'}) == \
+        [('bomdia', 3), ('bondia', 1)]
+
+    #new tags show up right away, counts after TAG_INDEX_TTL
+    client_with_tok.post('/texts', data={'content': 'dd', 'tags': 'bolo,boa'})
+    assert suggest({'prefix': 'bo'}) == \
+        [('bomdia', 3), ('boa', 1), ('bondia', 1), ('bolo', 0)]
+    app.config['TAG_INDEX_TTL'] = 0
+    assert suggest({'prefix': 'bo'}) == \
+        [('bomdia', 3), ('boa', 2), ('bolo', 1), ('bondia', 1)]
+
+def test_tags_suggest_bounded_number_of_statements(
+        client_with_tok, max_sql_statements):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    #token check, tags
+    with max_sql_statements(2):
+        client_with_tok.get('/tags-suggest?prefix=a')
+    #token check
+    with max_sql_statements(1):
+        resp = client_with_tok.get('/tags-suggest?prefix=a')
+    assert resp.json == {'tags': [{'content': 'a', 'n_texts': 1}]}
+
+def test_tags_suggest_invalid_args(client_with_tok):
+    for query in ['', '?prefix=a&max_n_results=101', '?prefix=a&fuzzy=nope']:
+        resp = client_with_tok.get('/tags-suggest' + query)
+        assert resp.status_code == 400
+        assert set(resp.json.keys()) == {'errors'}
+    assert client_with_tok.get('/tags-suggest').status_code == 400
+
+def test_tags_suggest_cannot_get_logged_of(client):
+    assert client.get('/tags-suggest?prefix=a').status_code == 401
+
+def test_tag_named_suggest_is_reachable(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'suggest'})
+    resp = client_with_tok.get('/tags/suggest')
+    assert resp.status_code == 200
+    assert resp.json == {'tag': {'content': 'suggest', 'n_texts': 1}}
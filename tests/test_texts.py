@@ -1,3 +1,28 @@
+import datetime as dt
+import json
+
+import pytest
+
+from memedata.database import db
+from memedata.extensions import (
+    tag_id_cache,
+    tag_index,
+    texts_query_cache,
+    text_ids_cache,
+)
+from memedata.models import Text, Tag, Rotation, Snapshot
+from memedata.serializers import dump_texts
+from memedata.resources.texts import (
+    TextsRes,
+    TextsExportRes,
+    TextsRandomRes,
+    TextsNextRes,
+    insert_tags,
+    insert_text_rows,
+    get_tag_ids,
+    bump_texts_generation,
+)
+
 def test_texts_get_correct_response_format_1(client_with_tok):
     resp = client_with_tok.get('/texts')
     assert resp.status_code == 200
@@ -64,6 +89,24 @@ def test_texts_get_search_correct_elems_1(client_with_tok):
     elems = client_with_tok.get('/texts?any_tags=y').json['texts']
     assert len(elems) == 0
 
+def test_texts_get_search_any_tags_no_duplicates(
+        app, client_with_tok, sql_statements):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b,c'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b,c'})
+    client_with_tok.post('/texts', data={'content': 'cc', 'tags': 'x'})
+
+    elems = client_with_tok.get('/texts?any_tags=a,b,c').json['texts']
+    assert sorted(e['content'] for e in elems) == ['aa', 'bb']
+    obj = client_with_tok.get('/texts?any_tags=a,b,c&max_n_results=2').json
+    assert obj['offset'] is None
+
+    with app.app_context():
+        del sql_statements[:]
+        texts, __, __ = TextsRes.filter_texts(
+            {'any_tags': ['a', 'b', 'c'], 'offset': 0, 'max_n_results': 10})
+        assert sorted(t.content for t in texts) == ['aa', 'bb']
+        assert len(sql_statements) == 1
+
 def test_texts_get_search_correct_elems_2(client_with_tok):
     client_with_tok.post('/texts', data={'content': 'test aaa', 'tags': 'a,b,c'})
     client_with_tok.post('/texts', data={'content': 'SLIRBORA', 'tags': 'a,b'})
@@ -78,6 +121,18 @@ def test_texts_get_search_correct_elems_2(client_with_tok):
     elems = client_with_tok.get('/texts?all_tags=x').json['texts']
     assert len(elems) == 0
 
+def test_texts_get_search_all_tags_repeated_or_missing(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'test aaa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'SLIRBORA', 'tags': 'a'})
+
+    elems = client_with_tok.get('/texts?all_tags=a,a').json['texts']
+    assert len(elems) == 2
+    elems = client_with_tok.get('/texts?all_tags=b,a,b').json['texts']
+    assert len(elems) == 1
+    assert elems[0]['content'] == 'test aaa'
+    elems = client_with_tok.get('/texts?all_tags=a,x').json['texts']
+    assert len(elems) == 0
+
 def test_texts_get_search_correct_elems_3(client_with_tok):
     client_with_tok.post('/texts', data={'content': 'test aaa', 'tags': 'a,b,c'})
     client_with_tok.post('/texts', data={'content': 'SLIRBORA', 'tags': 'a,b'})
@@ -120,6 +175,40 @@ def test_texts_get_search_correct_elems_5(client_with_tok):
         '/texts?date_from=2000-01-01&date_to=1994-03-24').json['texts']
     assert len(elems) == 0
 
+def test_texts_get_search_datetime_range(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'test aaa'})
+    now = dt.datetime.utcnow().replace(microsecond=0)
+    before = (now - dt.timedelta(hours=1)).isoformat()
+    after = (now + dt.timedelta(hours=1)).isoformat()
+
+    elems = client_with_tok.get('/texts', query_string={
+        'datetime_from': before, 'datetime_to': after}).json['texts']
+    assert len(elems) == 1
+    elems = client_with_tok.get('/texts', query_string={
+        'datetime_to': before}).json['texts']
+    assert len(elems) == 0
+    elems = client_with_tok.get('/texts', query_string={
+        'datetime_from': after}).json['texts']
+    assert len(elems) == 0
+
+def test_texts_get_search_datetime_range_tz(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'test aaa'})
+    now = dt.datetime.utcnow().replace(microsecond=0)
+    before = (now - dt.timedelta(hours=1)).isoformat()
+
+    elems = client_with_tok.get('/texts', query_string={
+        'datetime_from': before, 'tz': 'UTC'}).json['texts']
+    assert len(elems) == 1
+    #one hour before now in UTC is two hours after now in UTC-3
+    elems = client_with_tok.get('/texts', query_string={
+        'datetime_from': before, 'tz': 'Etc/GMT+3'}).json['texts']
+    assert len(elems) == 0
+
+def test_texts_get_search_tz_error_format(client_with_tok):
+    resp = client_with_tok.get('/texts?tz=Mars/Olympus_Mons')
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+
 def test_texts_get_search_correct_elems_6(client_with_tok):
     client_with_tok.post('/texts',
         data={'content': 'test aaa', 'tags': 'a,b,c'})
@@ -158,6 +247,23 @@ def test_texts_get_search_correct_elems_7(client_with_tok):
     assert len(elems2) == 0
     assert len(elems3) == 0
 
+def test_texts_get_search_correct_elems_8(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b,c'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'cc', 'tags': 'a,d'})
+    client_with_tok.post('/texts', data={'content': 'dd'})
+    blacklist = ','.join(['c', 'natal', 'pascoa', 'carnaval', 'd'])
+
+    elems = client_with_tok.get('/texts',
+        query_string={'no_tags': blacklist}).json['texts']
+    assert {e['content'] for e in elems} == {'bb', 'dd'}
+    elems = client_with_tok.get('/texts',
+        query_string={'all_tags': 'a', 'no_tags': blacklist}).json['texts']
+    assert {e['content'] for e in elems} == {'bb'}
+    elems = client_with_tok.get('/texts',
+        query_string={'no_tags': 'natal,pascoa'}).json['texts']
+    assert len(elems) == 4
+
 def test_texts_get_ignores_form(client_with_tok):
     client_with_tok.post('/texts',
         query_string={'content': 'test aaa', 'tags': 'a,b,c'})
@@ -201,6 +307,92 @@ def test_texts_correct_pagination_2(client_with_tok):
     assert obj2['offset'] == None
     assert {o['content'] for o in obj2['texts']} == {'cc', 'dd'}
 
+def test_texts_correct_cursor_pagination_1(client_with_tok):
+    for content in ['aa', 'bb', 'cc', 'dd', 'ee']:
+        client_with_tok.post('/texts', data={'content': content})
+
+    obj = client_with_tok.get('/texts?max_n_results=2').json
+    contents = [o['content'] for o in obj['texts']]
+    while obj['next_cursor'] is not None:
+        obj = client_with_tok.get('/texts', query_string={
+            'max_n_results': 2, 'cursor': obj['next_cursor']}).json
+        assert obj['offset'] is None
+        contents.extend(o['content'] for o in obj['texts'])
+    assert len(contents) == 5
+    assert set(contents) == {'aa', 'bb', 'cc', 'dd', 'ee'}
+
+def test_texts_correct_cursor_pagination_2(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    client_with_tok.post('/texts', data={'content': 'cc', 'tags': 'a'})
+
+    obj1 = client_with_tok.get('/texts?max_n_results=1&no_tags=b').json
+    obj2 = client_with_tok.get('/texts', query_string={'max_n_results': 1,
+        'no_tags': 'b', 'cursor': obj1['next_cursor']}).json
+    contents = [o['content'] for o in obj1['texts'] + obj2['texts']]
+    assert set(contents) == {'aa', 'cc'}
+    assert obj2['next_cursor'] is None
+
+def test_texts_cursor_pagination_error_format(client_with_tok):
+    resp = client_with_tok.get('/texts?cursor=notacursor')
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+
+@pytest.mark.parametrize('n_texts', [10, 100, 1000])
+def test_texts_get_bounded_number_of_statements(
+        client_with_tok, max_sql_statements, n_texts):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 't{}'.format(i), 'tags': ['a', 'b{}'.format(i%3)]} \
+            for i in range(n_texts)])
+
+    #token check, texts generation, texts, tags (select-in batches of 500)
+    with max_sql_statements(3 + 2):
+        resp = client_with_tok.get(
+            '/texts', query_string={'max_n_results': n_texts})
+    assert len(resp.json['texts']) == n_texts
+    assert all(len(o['tags']) == 2 for o in resp.json['texts'])
+
+def test_texts_get_fields_projected_in_sql(
+        client_with_tok, sql_statements):
+    client_with_tok.post('/texts', data={'content': 'test1', 'tags': 'a,b'})
+    del sql_statements[:]
+    resp = client_with_tok.get('/texts?fields=text_id,content')
+    assert resp.json['texts'][0] == {'text_id': 1, 'content': 'test1'}
+    #no tags query, no unrequested columns
+    assert not any('tags' in s for s in sql_statements)
+    assert not any('texts.updated_at' in s for s in sql_statements)
+
+@pytest.mark.parametrize('fields', [None, ['content'], ['tags', 'text_id']])
+def test_texts_records_same_output_as_orm(app, client_with_tok, fields):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 't{}'.format(i), 'tags': ['a', 'b{}'.format(i%3)][:i%3]} \
+            for i in range(7)])
+    client_with_tok.put('/texts/3', data={'content': 'updated'})
+    args = {'offset': 0, 'max_n_results': 5}
+    with app.app_context():
+        texts, offset, cursor = TextsRes.filter_texts(dict(args))
+        records, rec_offset, rec_cursor = TextsRes.filter_text_records(
+            dict(args), fields)
+        assert (rec_offset, rec_cursor) == (offset, cursor)
+        assert not hasattr(records[0], '__dict__')
+        assert dump_texts(records, fields) == dump_texts(texts, fields)
+
+def test_texts_get_unknown_fields(client_with_tok):
+    resp = client_with_tok.get('/texts?fields=content,nope')
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+    resp = client_with_tok.get('/texts/export?fields=nope')
+    assert resp.status_code == 400
+
+def test_texts_get_fields_with_cursor(client_with_tok):
+    for i in range(3):
+        client_with_tok.post('/texts', data={'content': 't{}'.format(i)})
+    resp = client_with_tok.get('/texts?fields=content&max_n_results=2')
+    assert all(set(o.keys()) == {'content'} for o in resp.json['texts'])
+    resp = client_with_tok.get('/texts', query_string={
+        'fields': 'content', 'cursor': resp.json['next_cursor']})
+    assert len(resp.json['texts']) == 1
+
 def test_texts_get_cannot_get_logged_of(client):
     resp = client.get('/texts')
     assert resp.status_code == 401
@@ -258,6 +450,79 @@ def test_texts_post_correct_response_fields_3(client_with_tok):
     assert obj['updated_at'] is None
     assert set(obj['tags']) == {'ey', 'b0ss'}
 
+def test_texts_post_tags_bounded_number_of_statements(
+        client_with_tok, sql_statements):
+    tags_1 = ','.join('t{}'.format(i) for i in range(2))
+    tags_2 = ','.join('t{}'.format(i) for i in range(16))
+    client_with_tok.post('/texts', data={'content': 'a', 'tags': tags_2})
+
+    del sql_statements[:]
+    client_with_tok.post('/texts', data={'content': 'b', 'tags': tags_1})
+    n_statements_1 = len(sql_statements)
+    del sql_statements[:]
+    resp = client_with_tok.post('/texts', data={'content': 'c', 'tags': tags_2})
+    n_statements_2 = len(sql_statements)
+
+    assert len(resp.json['text']['tags']) == 16
+    assert n_statements_1 == n_statements_2
+
+def test_texts_tag_id_cache(app):
+    with app.app_context():
+        ids_1 = get_tag_ids(['a', 'b', 'a'])
+        assert tag_id_cache.stats()['misses'] == 2
+        db.session.commit()
+        #created tags are cached once found committed
+        ids_2 = get_tag_ids(['b', 'a'])
+        ids_3 = get_tag_ids(['a', 'b'])
+        assert tag_id_cache.stats()['hits'] == 2
+        assert len(ids_1) == 2
+        assert ids_2 == ids_1[::-1] == ids_3[::-1]
+
+def test_texts_insert_tags_keeps_caller_transaction(app):
+    with app.app_context():
+        db.session.add(Text(content='pending'))
+        db.session.flush()
+        insert_tags(['a'])
+        insert_tags(['a', 'b'])
+        assert Text.query.count() == 1
+        db.session.rollback()
+        assert Text.query.count() == 0
+        assert Tag.query.count() == 0
+        assert tag_id_cache.get('a') is None
+        assert len(get_tag_ids(['a'])) == 1
+
+def test_texts_insert_tags_without_prior_writes(app):
+    with app.app_context():
+        tag_index.index
+        #the savepoint must not begin (and commit) a transaction of its own
+        insert_tags(['a'])
+        db.session.rollback()
+        assert Tag.query.count() == 0
+        assert tag_index.index.suggest('a', 10) == []
+        insert_tags(['b'])
+        db.session.commit()
+        assert Tag.query.count() == 1
+        assert tag_index.index.suggest('b', 10) == [('b', 0)]
+
+def test_texts_insert_tags_tolerates_existing_tags(app):
+    with app.app_context():
+        insert_tags(['a'])
+        insert_tags(['b', 'a', 'c'])
+        contents = {t.content for t in Tag.query.all()}
+        assert contents == {'a', 'b', 'c'}
+
+def test_texts_insert_text_rows(app, client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'old'})
+    contents = ['t{}'.format(i) for i in range(1203)]
+    with app.app_context():
+        text_ids = insert_text_rows(contents)
+        db.session.commit()
+        rows = db.session.execute('SELECT text_id, content FROM texts')
+        assert dict(zip(text_ids, contents)) == \
+            {i: c for i, c in rows if c != 'old'}
+    resp = client_with_tok.post('/texts', data={'content': 'new'})
+    assert resp.json['text']['text_id'] == 1205
+
 def test_texts_post_ignores_spurious_args(client_with_tok):
     resp = client_with_tok.post('/texts',
         data={'content': 'test 1', 'ow': 'hehe', 'ljh': 'hhh'})
@@ -324,6 +589,230 @@ def test_text_get_correct_response_format_2(client_with_tok):
         query_string={'fields': 'text_id,tags'})
     assert set(resp.json['text'].keys()) == {'text_id', 'tags'}
 
+def test_text_get_bounded_number_of_statements(
+        client_with_tok, max_sql_statements):
+    resp = client_with_tok.post('/texts',
+        data={'content': 'test1', 'tags': 'a,b,c,d'})
+    text_id = resp.json['text']['text_id']
+
+    #token check, text, tags
+    with max_sql_statements(3):
+        resp = client_with_tok.get('/texts/{}'.format(text_id))
+    assert set(resp.json['text']['tags']) == {'a', 'b', 'c', 'd'}
+
+def test_text_get_fields_projected_in_sql(client_with_tok, sql_statements):
+    client_with_tok.post('/texts', data={'content': 'test1', 'tags': 'a,b'})
+    del sql_statements[:]
+    resp = client_with_tok.get('/texts/1?fields=content')
+    assert resp.json['text'] == {'content': 'test1'}
+    assert not any('tags' in s for s in sql_statements)
+    resp = client_with_tok.get('/texts/1?fields=nope')
+    assert resp.status_code == 400
+
+def test_text_get_conditional(
+        client_with_tok, max_sql_statements, sql_statements):
+    client_with_tok.post('/texts', data={'content': 'test1', 'tags': 'a'})
+    resp = client_with_tok.get('/texts/1')
+    etag = resp.headers['ETag']
+    last_modified = resp.headers['Last-Modified']
+
+    assert not etag.startswith('W/')
+    #token check, text version and timestamps
+    with max_sql_statements(2):
+        resp = client_with_tok.get('/texts/1',
+            headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert not any('tags' in s for s in sql_statements)
+    assert resp.data == b''
+    assert resp.headers['ETag'] == etag
+    resp = client_with_tok.get('/texts/1',
+        headers={'If-Modified-Since': last_modified})
+    assert resp.status_code == 304
+    resp = client_with_tok.get('/texts/1',
+        headers={'If-Modified-Since': 'Sat, 01 Jan 2000 00:00:00 GMT'})
+    assert resp.status_code == 200
+    #if-none-match takes precedence
+    resp = client_with_tok.get('/texts/1', headers={
+        'If-None-Match': '"nope"', 'If-Modified-Since': last_modified})
+    assert resp.status_code == 200
+
+    #representations with other fields have other tags
+    resp = client_with_tok.get('/texts/1?fields=content',
+        headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
+
+    #changing tags only changes the tag
+    client_with_tok.put('/texts/1', data={'tags': 'b'})
+    resp = client_with_tok.get('/texts/1', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.json['text']['tags'] == ['b']
+    assert resp.headers['ETag'] != etag
+
+def test_text_get_conditional_same_second_updates(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'test1'})
+    client_with_tok.put('/texts/1', data={'content': 'test2'})
+    etag = client_with_tok.get('/texts/1').headers['ETag']
+    #timestamps have second precision, so both updates may share them
+    client_with_tok.put('/texts/1', data={'content': 'test3'})
+    resp = client_with_tok.get('/texts/1', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.json['text']['content'] == 'test3'
+    assert resp.headers['ETag'] != etag
+    etag = resp.headers['ETag']
+    #bulk updates bump versions too
+    client_with_tok.patch('/texts', data={'text_ids': '1', 'add_tags': 'a'})
+    resp = client_with_tok.get('/texts/1', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.json['text']['tags'] == ['a']
+
+def test_texts_get_conditional(client_with_tok, max_sql_statements):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a'})
+    resp = client_with_tok.get('/texts?any_tags=a')
+    etag = resp.headers['ETag']
+    assert 'Last-Modified' in resp.headers
+
+    #token check, texts generation
+    with max_sql_statements(2):
+        resp = client_with_tok.get('/texts?any_tags=a',
+            headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert resp.data == b''
+    resp = client_with_tok.get('/texts?any_tags=b',
+        headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+
+    def changed(write):
+        nonlocal etag
+        write()
+        resp = client_with_tok.get('/texts?any_tags=a',
+            headers={'If-None-Match': etag})
+        assert resp.status_code == 200
+        assert resp.headers['ETag'] != etag
+        etag = resp.headers['ETag']
+        return resp
+
+    resp = changed(lambda: client_with_tok.post('/texts',
+        data={'content': 'bb', 'tags': 'a'}))
+    assert len(resp.json['texts']) == 2
+    changed(lambda: client_with_tok.put('/texts/1', data={'tags': 'a,b'}))
+    changed(lambda: client_with_tok.patch('/texts',
+        data={'any_tags': 'a', 'add_tags': 'c'}))
+    changed(lambda: client_with_tok.post('/texts/batch',
+        json=[{'content': 'cc', 'tags': ['a']}]))
+    changed(lambda: client_with_tok.delete('/texts/1'))
+    resp = changed(lambda: client_with_tok.delete('/texts?any_tags=a'))
+    assert resp.json['texts'] == []
+
+def test_texts_get_cached(app, client_with_tok, max_sql_statements):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 'aa', 'tags': ['a', 'b']}, {'content': 'bb', 'tags': 'b'}])
+    resp = client_with_tok.get('/texts?any_tags=a,b&fields=content')
+    assert sorted(t['content'] for t in resp.json['texts']) == ['aa', 'bb']
+
+    #token check, texts generation
+    with max_sql_statements(2):
+        cached = client_with_tok.get('/texts?fields=content&any_tags=b,a')
+    assert cached.data == resp.data
+    assert cached.headers['ETag'] == resp.headers['ETag']
+    assert cached.headers['Content-Type'] == 'application/json'
+    with app.app_context():
+        stats = texts_query_cache.stats()
+    assert (stats['n_items'], stats['hits']) == (1, 1)
+    assert stats['size'] == len(resp.data)
+
+    client_with_tok.put('/texts/1', data={'content': 'cc'})
+    resp = client_with_tok.get('/texts?any_tags=a,b&fields=content')
+    assert sorted(t['content'] for t in resp.json['texts']) == ['bb', 'cc']
+
+def test_texts_get_cache_sees_writes_of_other_processes(app, client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa'})
+    assert len(client_with_tok.get('/texts').json['texts']) == 1
+    #as done by another process, which cannot clear this one's caches
+    with app.app_context():
+        db.session.execute(Text.__table__.insert(), {'content': 'bb'})
+        bump_texts_generation()
+        db.session.commit()
+    assert len(client_with_tok.get('/texts').json['texts']) == 2
+
+def test_caches_get(client_with_tok, su_with_tok):
+    client_with_tok.get('/texts')
+    client_with_tok.get('/texts')
+    resp = su_with_tok.get('/caches')
+    assert resp.status_code == 200
+    stats = resp.json['caches']
+    assert set(stats) == {'tag_id_cache', 'text_ids_cache',
+        'texts_query_cache', 'text_counts_cache', 'revoked_tokens_cache'}
+    assert stats['texts_query_cache']['hits'] == 1
+    assert stats['texts_query_cache']['size'] > 0
+    assert client_with_tok.get('/caches').status_code == 401
+
+def test_texts_count(client_with_tok):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 'bom dia', 'tags': ['a', 'b']},
+        {'content': 'boa noite', 'tags': ['b']},
+        {'content': 'bom dia flores', 'tags': ['c']}])
+
+    def count(query):
+        resp = client_with_tok.get('/texts/count', query_string=query)
+        assert resp.status_code == 200
+        assert resp.json['approximate'] is False
+        n_texts = resp.json['n_texts']
+        resp = client_with_tok.get('/texts', query_string=query)
+        assert n_texts == len(resp.json['texts'])
+        return n_texts
+
+    assert count({}) == 3
+    assert count({'any_tags': 'a,c'}) == 2
+    assert count({'all_tags': 'a,b'}) == 1
+    assert count({'no_tags': 'b'}) == 1
+    assert count({'q': 'bom dia'}) == 2
+    assert count({'any_tags': 'b', 'q': 'dia'}) == 1
+    assert count({'date_to': '2000-01-01'}) == 0
+
+def test_texts_count_cached(app, client_with_tok, max_sql_statements):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a'})
+    resp = client_with_tok.get('/texts/count?any_tags=a')
+    assert resp.json == {'n_texts': 1, 'approximate': False}
+    #token check, texts generation
+    with max_sql_statements(2):
+        resp = client_with_tok.get('/texts/count?any_tags=a')
+    assert resp.json == {'n_texts': 1, 'approximate': False}
+
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'a'})
+    resp = client_with_tok.get('/texts/count?any_tags=a&approximate=true')
+    assert resp.json == {'n_texts': 1, 'approximate': True}
+    resp = client_with_tok.get('/texts/count?any_tags=a')
+    assert resp.json == {'n_texts': 2, 'approximate': False}
+
+    client_with_tok.post('/texts', data={'content': 'cc', 'tags': 'a'})
+    app.config['TEXT_COUNTS_MAX_AGE'] = 0
+    resp = client_with_tok.get('/texts/count?any_tags=a&approximate=true')
+    assert resp.json == {'n_texts': 3, 'approximate': False}
+
+def test_texts_head_total_count(client_with_tok):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 'aa', 'tags': ['a']}, {'content': 'bb', 'tags': ['b']}])
+    resp = client_with_tok.head('/texts?any_tags=a&max_n_results=0')
+    assert resp.status_code == 200
+    assert resp.headers['X-Total-Count'] == '1'
+    assert resp.headers['X-Total-Count-Approximate'] == 'false'
+    assert resp.data == b''
+    resp = client_with_tok.head('/texts')
+    assert resp.headers['X-Total-Count'] == '2'
+    resp = client_with_tok.head('/texts?date_from=nope')
+    assert resp.status_code == 400
+
+def test_texts_count_invalid_args(client_with_tok):
+    for query in ['date_from=nope', 'approximate=nope', 'tz=nope']:
+        resp = client_with_tok.get('/texts/count?' + query)
+        assert resp.status_code == 400
+        assert set(resp.json.keys()) == {'errors'}
+
+def test_texts_count_cannot_get_logged_of(client):
+    assert client.get('/texts/count').status_code == 401
+    assert client.head('/texts').status_code == 401
+
 def test_text_get_ignores_form(client_with_tok):
     resp = client_with_tok.post('/texts',
         data={'content': 'test1', 'tags': 'lel,hue'})
@@ -454,3 +943,398 @@ def test_text_delete_cannot_delete_logged_of(client_with_tok, client):
     resp1 = client_with_tok.post('/texts?content=eyb0ss')
     resp2 = client.delete('/texts/{}'.format(resp1.json['text']['text_id']))
     assert resp2.status_code == 401
+
+def test_texts_batch_post_correct_response_format(client_with_tok):
+    resp = client_with_tok.post('/texts/batch', json=[
+        {'content': 'aa', 'tags': ['a', 'b']},
+        {'content': 'bb', 'tags': 'b,c'},
+        {'content': 'cc'},
+    ])
+    assert resp.status_code == 201
+    assert resp.json['n_created'] == 3
+    assert all(set(o.keys()) == {'text_id'} for o in resp.json['texts'])
+
+    text_id = resp.json['texts'][1]['text_id']
+    obj = client_with_tok.get('/texts/{}'.format(text_id)).json['text']
+    assert obj['content'] == 'bb'
+    assert set(obj['tags']) == {'b', 'c'}
+    elems = client_with_tok.get('/texts?any_tags=b').json['texts']
+    assert len(elems) == 2
+
+def test_texts_batch_post_per_item_errors(client_with_tok):
+    resp = client_with_tok.post('/texts/batch', json=[
+        {'content': 'aa', 'tags': ['a']},
+        {'tags': ['a']},
+        {'content': 'bb', 'tags': ['UPPER']},
+        'notanobject',
+        {'content': 'cc'},
+    ])
+    assert resp.status_code == 201
+    assert resp.json['n_created'] == 2
+    objs = resp.json['texts']
+    assert 'text_id' in objs[0] and 'text_id' in objs[4]
+    assert all('errors' in o for o in objs[1:4])
+    elems = client_with_tok.get('/texts').json['texts']
+    assert {e['content'] for e in elems} == {'aa', 'cc'}
+
+def test_texts_batch_post_ndjson_chunks(client_with_tok):
+    lines = ['{{"content": "t{}", "tags": ["x"]}}'.format(i) for i in range(5)]
+    resp = client_with_tok.post('/texts/batch?chunk_size=2',
+        data='\n'.join(lines), content_type='application/x-ndjson')
+    assert resp.status_code == 201
+    assert resp.json['n_created'] == 5
+    assert len({o['text_id'] for o in resp.json['texts']}) == 5
+    elems = client_with_tok.get('/texts?all_tags=x').json['texts']
+    assert len(elems) == 5
+
+def test_texts_batch_post_inserts_in_bulk(client_with_tok, sql_statements):
+    items = [{'content': 't{}'.format(i)} for i in range(1000)]
+    resp = client_with_tok.post('/texts/batch', json=items)
+    assert [o['text_id'] for o in resp.json['texts']] == list(range(1, 1001))
+    inserts = [s for s in sql_statements \
+        if s.startswith('INSERT INTO texts (')]
+    assert len(inserts) == 2
+    obj = client_with_tok.get('/texts/1000').json['text']
+    assert obj['content'] == 't999'
+
+def test_texts_batch_post_many_tags_in_bounded_statements(
+        client_with_tok, sql_statements):
+    items = [{'content': 't{}'.format(i), 'tags': ['tag{}'.format(i)]} \
+        for i in range(1200)]
+    resp = client_with_tok.post('/texts/batch', json=items)
+    assert resp.status_code == 201
+    selects = [s for s in sql_statements if 'FROM tags' in s]
+    assert selects
+    #within the 999 variables limit of some sqlite builds
+    assert max(s.count('?') for s in selects) <= TextsRes.BULK_CHUNK_SIZE
+    objs = client_with_tok.get('/texts?all_tags=tag1199').json['texts']
+    assert [o['content'] for o in objs] == ['t1199']
+
+def test_texts_batch_post_correct_error_format(client_with_tok):
+    resp = client_with_tok.post('/texts/batch', data='[{"content": ',
+        content_type='application/json')
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+    resp = client_with_tok.post('/texts/batch', json={'content': 'aa'})
+    assert resp.status_code == 400
+
+def test_texts_batch_post_cannot_post_logged_of(client):
+    resp = client.post('/texts/batch', json=[{'content': 'aa'}])
+    assert resp.status_code == 401
+
+def test_texts_bulk_delete_by_ids(client_with_tok):
+    ids = [client_with_tok.post('/texts', data={'content': c}).json['text']\
+        ['text_id'] for c in ['aa', 'bb', 'cc']]
+    resp = client_with_tok.delete('/texts', query_string={
+        'text_ids': '{},{},9999'.format(ids[0], ids[2])})
+    assert resp.status_code == 200
+    assert resp.json['n_affected'] == 2
+    elems = client_with_tok.get('/texts').json['texts']
+    assert [e['content'] for e in elems] == ['bb']
+
+def test_texts_bulk_delete_by_filters_dry_run(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    client_with_tok.post('/texts', data={'content': 'cc', 'tags': 'c'})
+
+    resp = client_with_tok.delete('/texts?any_tags=b&dry_run=true')
+    assert resp.json == {'n_affected': 2, 'dry_run': True}
+    assert len(client_with_tok.get('/texts').json['texts']) == 3
+    resp = client_with_tok.delete('/texts?any_tags=b')
+    assert resp.json == {'n_affected': 2, 'dry_run': False}
+    elems = client_with_tok.get('/texts').json['texts']
+    assert [e['content'] for e in elems] == ['cc']
+    assert client_with_tok.get('/texts?any_tags=a').json['texts'] == []
+
+def test_texts_bulk_delete_requires_selection(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa'})
+    resp = client_with_tok.delete('/texts')
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+    assert len(client_with_tok.get('/texts').json['texts']) == 1
+
+def test_texts_bulk_patch_tags(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    client_with_tok.post('/texts', data={'content': 'cc', 'tags': 'c'})
+
+    resp = client_with_tok.patch('/texts?any_tags=b',
+        data={'add_tags': 'a,x', 'remove_tags': 'b'})
+    assert resp.status_code == 200
+    assert resp.json == {'n_affected': 2, 'dry_run': False}
+    elems = client_with_tok.get('/texts').json['texts']
+    tags = {e['content']: sorted(e['tags']) for e in elems}
+    assert tags == {'aa': ['a', 'x'], 'bb': ['a', 'x'], 'cc': ['c']}
+    assert all(e['updated_at'] for e in elems if e['content'] != 'cc')
+
+def test_texts_bulk_patch_dry_run(client_with_tok):
+    obj = client_with_tok.post('/texts', data={'content': 'aa'}).json['text']
+    resp = client_with_tok.patch('/texts', data={
+        'text_ids': str(obj['text_id']), 'add_tags': 'a', 'dry_run': 'true'})
+    assert resp.json == {'n_affected': 1, 'dry_run': True}
+    assert client_with_tok.get('/texts?any_tags=a').json['texts'] == []
+
+def test_texts_bulk_patch_without_changes(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a'})
+    etag = client_with_tok.get('/texts').headers['ETag']
+    resp = client_with_tok.patch('/texts?text_ids=1')
+    assert resp.status_code == 400
+    assert set(resp.json.keys()) == {'errors'}
+    resp = client_with_tok.patch('/texts?any_tags=a',
+        data={'add_tags': 'a', 'remove_tags': 'b'})
+    assert resp.json == {'n_affected': 1, 'dry_run': False}
+    resp = client_with_tok.get('/texts')
+    assert resp.json['texts'][0]['updated_at'] is None
+    assert resp.headers['ETag'] == etag
+
+def test_texts_bulk_statements_do_not_grow_with_texts(client_with_tok,
+        sql_statements):
+    n_statements = []
+    #first rounds create and cache tags
+    for n_texts in [2, 2, 2, 1200]:
+        client_with_tok.post('/texts/batch', json=[
+            {'content': 't{}'.format(i), 'tags': ['a']} \
+                for i in range(n_texts)])
+        del sql_statements[:]
+        resp = client_with_tok.patch('/texts?any_tags=a',
+            data={'add_tags': 'b', 'remove_tags': 'a'})
+        assert resp.json['n_affected'] == n_texts
+        resp = client_with_tok.delete('/texts?any_tags=b')
+        assert resp.json['n_affected'] == n_texts
+        n_statements.append(len(sql_statements))
+    assert n_statements[-2] == n_statements[-1]
+    assert client_with_tok.get('/texts').json['texts'] == []
+
+def test_texts_bulk_cannot_change_logged_of(client):
+    assert client.delete('/texts?text_ids=1').status_code == 401
+    assert client.patch('/texts?text_ids=1').status_code == 401
+
+def test_texts_export_correct_response_format(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    client_with_tok.post('/texts', data={'content': 'cc'})
+
+    resp = client_with_tok.get('/texts/export')
+    assert resp.status_code == 200
+    assert resp.mimetype == 'application/x-ndjson'
+    objs = [json.loads(l) for l in resp.get_data(as_text=True).splitlines()]
+    texts = client_with_tok.get('/texts').json['texts']
+    assert objs == texts
+
+def test_texts_export_filters_and_fields(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a,b'})
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'b'})
+    client_with_tok.post('/texts', data={'content': 'cc'})
+
+    resp = client_with_tok.get('/texts/export?any_tags=b&fields=content')
+    objs = [json.loads(l) for l in resp.get_data(as_text=True).splitlines()]
+    assert sorted(objs, key=lambda o: o['content']) == \
+        [{'content': 'aa'}, {'content': 'bb'}]
+
+def test_texts_export_in_chunks(client_with_tok, monkeypatch):
+    monkeypatch.setattr(TextsExportRes, 'CHUNK_SIZE', 2)
+    client_with_tok.post('/texts/batch',
+        json=[{'content': 't{}'.format(i)} for i in range(5)])
+    resp = client_with_tok.get('/texts/export')
+    objs = [json.loads(l) for l in resp.get_data(as_text=True).splitlines()]
+    assert sorted(o['content'] for o in objs) == \
+        ['t{}'.format(i) for i in range(5)]
+
+def test_texts_export_cannot_get_logged_of(client):
+    resp = client.get('/texts/export')
+    assert resp.status_code == 401
+
+def test_texts_random_respects_filters(client_with_tok):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 't{}'.format(i), 'tags': ['a', 'b{}'.format(i%3)]} \
+            for i in range(30)])
+    resp = client_with_tok.get('/texts/random?n=100&all_tags=a,b1&no_tags=b2')
+    assert resp.status_code == 200
+    texts = resp.json['texts']
+    assert len(texts) == 10
+    assert len({t['text_id'] for t in texts}) == 10
+    assert all(set(t['tags']) == {'a', 'b1'} for t in texts)
+
+    resp = client_with_tok.get('/texts/random?any_tags=b0&fields=tags')
+    assert len(resp.json['texts']) == 1
+    assert set(resp.json['texts'][0].keys()) == {'tags'}
+    assert set(resp.json['texts'][0]['tags']) == {'a', 'b0'}
+
+    resp = client_with_tok.get('/texts/random?any_tags=nope')
+    assert resp.json['texts'] == []
+
+def test_texts_random_seed(client_with_tok):
+    client_with_tok.post('/texts/batch',
+        json=[{'content': 't{}'.format(i)} for i in range(50)])
+    get_ids = lambda query: [t['text_id'] for t in \
+        client_with_tok.get('/texts/random', query_string=query).json['texts']]
+    ids = get_ids({'n': 10, 'seed': 42})
+    assert get_ids({'n': 10, 'seed': 42}) == ids
+    assert get_ids({'n': 10, 'seed': 43}) != ids
+
+def test_texts_random_sees_changes(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a'})
+    resp = client_with_tok.get('/texts/random?n=10&any_tags=a')
+    assert [t['content'] for t in resp.json['texts']] == ['aa']
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'a'})
+    client_with_tok.delete('/texts/1')
+    resp = client_with_tok.get('/texts/random?n=10&any_tags=a')
+    assert [t['content'] for t in resp.json['texts']] == ['bb']
+
+def test_texts_random_tolerates_stale_ids(app, client_with_tok):
+    app.config['TEXT_IDS_MAX_AGE'] = 60
+    get_contents = lambda: sorted(t['content'] for t in client_with_tok.get(
+        '/texts/random?n=10&any_tags=a').json['texts'])
+    client_with_tok.post('/texts', data={'content': 'aa', 'tags': 'a'})
+    assert get_contents() == ['aa']
+    #ids are not selected again right after writes
+    client_with_tok.post('/texts', data={'content': 'bb', 'tags': 'a'})
+    assert get_contents() == ['aa']
+    client_with_tok.delete('/texts/1')
+    assert get_contents() == []
+    app.config['TEXT_IDS_MAX_AGE'] = 0
+    assert get_contents() == ['bb']
+
+def test_texts_random_bounded_number_of_statements(
+        client_with_tok, max_sql_statements, sql_statements):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 't{}'.format(i), 'tags': ['a']} for i in range(100)])
+    client_with_tok.get('/texts/random?any_tags=a')
+
+    #token check, texts generation, texts, tags; ids are cached
+    with max_sql_statements(4):
+        resp = client_with_tok.get('/texts/random?any_tags=a&n=20')
+    assert len(resp.json['texts']) == 20
+    assert not any('random' in s.lower() for s in sql_statements)
+
+def test_texts_random_invalid_n(client_with_tok):
+    for n in (0, TextsRandomRes.GET_MAX_N + 1):
+        resp = client_with_tok.get('/texts/random?n={}'.format(n))
+        assert resp.status_code == 400
+        assert set(resp.json.keys()) == {'errors'}
+
+def test_texts_random_cannot_get_logged_of(client):
+    resp = client.get('/texts/random')
+    assert resp.status_code == 401
+
+def get_next_ids(client, query):
+    resp = client.get('/texts/next', query_string=query)
+    assert resp.status_code == 200
+    return [t['text_id'] for t in resp.json['texts']], resp.json['cycle']
+
+def test_texts_next_no_repetition_within_cycle(client_with_tok):
+    client_with_tok.post('/texts/batch',
+        json=[{'content': 't{}'.format(i)} for i in range(20)])
+    seen = []
+    while True:
+        ids, cycle = get_next_ids(client_with_tok, {'consumer': 'bot', 'n': 3})
+        if cycle > 0:
+            break
+        seen.extend(ids)
+    assert sorted(seen) == list(range(1, 21))
+    #texts of next cycle come in another order
+    seen_2 = ids
+    while len(seen_2) < 20:
+        ids, cycle = get_next_ids(client_with_tok, {'consumer': 'bot', 'n': 3})
+        assert cycle == 1
+        seen_2.extend(ids)
+    assert sorted(seen_2) == list(range(1, 21))
+    assert seen_2 != seen
+
+def test_texts_next_per_consumer_and_filters(client_with_tok):
+    client_with_tok.post('/texts/batch', json=[
+        {'content': 't{}'.format(i), 'tags': ['a'] if i%2 else []} \
+            for i in range(10)])
+    ids_1, __ = get_next_ids(client_with_tok, {'consumer': 'bot1', 'n': 10})
+    ids_2, __ = get_next_ids(client_with_tok, {'consumer': 'bot2', 'n': 10})
+    assert sorted(ids_1) == sorted(ids_2) == list(range(1, 11))
+    ids, cycle = get_next_ids(client_with_tok,
+        {'consumer': 'bot1', 'n': 10, 'any_tags': 'a'})
+    assert sorted(ids) == [2, 4, 6, 8, 10]
+    assert cycle == 0
+
+def test_texts_next_with_changing_texts(client_with_tok):
+    client_with_tok.post('/texts/batch',
+        json=[{'content': 't{}'.format(i)} for i in range(10)])
+    ids, __ = get_next_ids(client_with_tok, {'consumer': 'bot', 'n': 5})
+    remaining = set(range(1, 11)) - set(ids)
+    deleted = remaining.pop()
+    client_with_tok.delete('/texts/{}'.format(deleted))
+    client_with_tok.post('/texts', data={'content': 'new'})
+    ids_2, cycle = get_next_ids(client_with_tok, {'consumer': 'bot', 'n': 10})
+    assert cycle == 0
+    assert set(ids_2) == remaining
+
+def test_texts_next_cycles_over_matching_ids(app, client_with_tok):
+    client_with_tok.post('/texts/batch', json=
+        [{'content': 'a', 'tags': ['a']}]
+        + [{'content': 't'} for __ in range(500)]
+        + [{'content': 'b', 'tags': ['a']}])
+    ids, __ = get_next_ids(client_with_tok,
+        {'consumer': 'bot', 'n': 1, 'any_tags': 'a'})
+    assert ids[0] in {1, 502}
+    with app.app_context():
+        rotation = Rotation.query.filter_by(consumer='bot').one()
+        snapshot = Snapshot.query.get(rotation.ids_digest)
+        #cycle over the matches, not the range of their ids
+        assert snapshot.n_ids == 2
+    client_with_tok.post('/texts', data={'content': 'd', 'tags': 'a'})
+    ids_2, cycle = get_next_ids(client_with_tok,
+        {'consumer': 'bot', 'n': 5, 'any_tags': 'a'})
+    assert (sorted(ids + ids_2), cycle) == ([1, 502], 0)
+
+def test_texts_next_stores_snapshots_once(app, client_with_tok):
+    client_with_tok.post('/texts/batch',
+        json=[{'content': 't{}'.format(i)} for i in range(3)])
+    for consumer in ['bot1', 'bot2']:
+        get_next_ids(client_with_tok, {'consumer': consumer, 'n': 3})
+    with app.app_context():
+        assert Snapshot.query.count() == 1
+        first = Snapshot.query.one().digest
+    #bot1 moves on to a new snapshot, bot2 still walks the first one
+    client_with_tok.post('/texts', data={'content': 't3'})
+    get_next_ids(client_with_tok, {'consumer': 'bot1', 'n': 3})
+    with app.app_context():
+        assert Snapshot.query.count() == 2
+    #unused snapshots are deleted
+    get_next_ids(client_with_tok, {'consumer': 'bot2', 'n': 3})
+    with app.app_context():
+        digests = {s.digest for s in Snapshot.query}
+        assert len(digests) == 1 and not first in digests
+        assert {r.ids_digest for r in Rotation.query} == digests
+
+def test_texts_next_restarts_deleted_snapshot(app, client_with_tok):
+    client_with_tok.post('/texts/batch',
+        json=[{'content': 't{}'.format(i)} for i in range(4)])
+    ids, cycle = get_next_ids(client_with_tok, {'consumer': 'bot', 'n': 2})
+    assert cycle == 0
+    with app.app_context():
+        db.session.query(Snapshot).delete()
+        db.session.commit()
+    text_ids_cache.clear()
+    ids, cycle = get_next_ids(client_with_tok, {'consumer': 'bot', 'n': 2})
+    assert (len(ids), cycle) == (2, 1)
+
+def test_texts_next_too_many_trials(client_with_tok, monkeypatch):
+    client_with_tok.post('/texts', data={'content': 'aa'})
+    monkeypatch.setattr(TextsNextRes, 'MAX_N_TRIALS', 0)
+    resp = client_with_tok.get('/texts/next?consumer=bot')
+    assert resp.status_code == 409
+    assert set(resp.json.keys()) == {'errors'}
+
+def test_texts_next_fields_and_empty_pool(client_with_tok):
+    client_with_tok.post('/texts', data={'content': 'aa'})
+    resp = client_with_tok.get('/texts/next?consumer=bot&fields=content')
+    assert resp.json == {'texts': [{'content': 'aa'}], 'cycle': 0}
+    resp = client_with_tok.get('/texts/next?consumer=bot&any_tags=nope')
+    assert resp.json == {'texts': [], 'cycle': None}
+
+def test_texts_next_invalid_args(client_with_tok):
+    for query in ('', 'consumer=', 'consumer=bot&n=0'):
+        resp = client_with_tok.get('/texts/next?{}'.format(query))
+        assert resp.status_code == 400
+        assert set(resp.json.keys()) == {'errors'}
+
+def test_texts_next_cannot_get_logged_of(client):
+    resp = client.get('/texts/next?consumer=bot')
+    assert resp.status_code == 401
@@ -0,0 +1,13 @@
+import pytest
+
+from memedata.util import permute
+
+@pytest.mark.parametrize('size', [1, 2, 3, 17, 256, 1000])
+def test_permute_is_bijection(size):
+    for key in (0, 1, 2**31 - 1):
+        values = [permute(i, size, key) for i in range(size)]
+        assert sorted(values) == list(range(size))
+
+def test_permute_depends_on_key():
+    assert [permute(i, 100, 1) for i in range(100)] \
+        != [permute(i, 100, 2) for i in range(100)]